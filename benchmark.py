@@ -0,0 +1,306 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+Result = namedtuple("Result", ['instance', 'wall_time', 'peak_rss_mb', 'obj', 'opt', 'status'])
+
+# assignments whose objective is maximized, every other one is minimized
+MAXIMIZE = {'Knapsack', 'Any Integer'}
+
+# seconds of a timeout kept for interpreter startup and parsing, the rest is
+# the time_limit handed to solve_it
+TIME_LIMIT_MARGIN = 2
+
+
+def load_metadata(week_dir):
+    '''
+    Reads the assignment name and graded input files from a week's _coursera
+    metadata file
+
+    Args:
+        week_dir: directory of the assignment
+
+    Returns:
+        assignment name and list of graded input files relative to week_dir
+    '''
+    with open(os.path.join(week_dir, '_coursera'), 'r') as metadata_file:
+        metadata_file.readline()
+        name = metadata_file.readline().strip()
+        input_files = [line.split(',')[1].strip()
+                       for line in metadata_file.readlines() if ',' in line]
+    return name, input_files
+
+
+def list_instances(week_dir, graded=False):
+    '''
+    Args:
+        week_dir: directory of the assignment
+        graded: only the graded subset listed in _coursera if True
+
+    Returns:
+        input files relative to week_dir
+    '''
+    if graded:
+        return load_metadata(week_dir)[1]
+    data_dir = os.path.join(week_dir, 'data')
+    return [os.path.join('.', 'data', f) for f in sorted(os.listdir(data_dir))]
+
+
+def peak_rss_mb():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    if sys.platform == 'darwin':
+        rss /= 1024
+    return rss / 1024
+
+
+def worker(solver_file, input_file, time_limit=None):
+    '''
+    Runs solve_it once in this process and prints the measurements as a JSON
+    line, called in a fresh interpreter so peak RSS belongs to one instance;
+    time_limit is passed on if solve_it accepts it
+    '''
+    from inspect import signature
+    sys.path.insert(0, os.getcwd())
+    pkg = __import__(os.path.splitext(os.path.basename(solver_file))[0])
+    with open(input_file, 'r') as input_data_file:
+        input_data = input_data_file.read()
+    kwargs = {}
+    if time_limit and 'time_limit' in signature(pkg.solve_it).parameters:
+        kwargs['time_limit'] = time_limit
+
+    start = time.perf_counter()
+    solution = pkg.solve_it(input_data, **kwargs)
+    end = time.perf_counter()
+
+    first_line = solution.split('\n')[0].split()
+    obj = float(first_line[0])
+    opt = int(first_line[1]) if len(first_line) > 1 else 0
+    print(json.dumps({'wall_time': end - start, 'peak_rss_mb': peak_rss_mb(), 'obj': obj, 'opt': opt}))
+
+
+def run_instance(week_dir, input_file, solver_file='solver.py', timeout=None):
+    '''
+    Args:
+        week_dir: directory of the assignment, used as working directory
+        input_file: input file relative to week_dir
+        solver_file: python file containing the solve_it function
+        timeout: seconds before the solver is killed, solve_it gets
+            the same budget less TIME_LIMIT_MARGIN as its time_limit
+
+    Returns:
+        a Result, with status 'ok', 'timeout' or 'error'
+    '''
+    instance = os.path.basename(input_file)
+    command = [sys.executable, os.path.abspath(__file__), '--worker', solver_file, input_file]
+    if timeout:
+        command.append(str(max(timeout - TIME_LIMIT_MARGIN, timeout / 2)))
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(command,
+                              cwd=week_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return Result(instance, time.perf_counter() - start, None, None, None, 'timeout')
+
+    lines = proc.stdout.strip().split('\n')
+    if proc.returncode != 0 or not lines[-1].startswith('{'):
+        print(proc.stderr.strip().split('\n')[-1], file=sys.stderr)
+        return Result(instance, time.perf_counter() - start, None, None, None, 'error')
+    measured = json.loads(lines[-1])
+    return Result(instance, measured['wall_time'], measured['peak_rss_mb'],
+                  measured['obj'], measured['opt'], 'ok')
+
+
+def save_results(results, file_location):
+    '''
+    Writes results as JSON if file_location ends with .json, CSV otherwise
+    '''
+    records = [r._asdict() for r in results]
+    with open(file_location, 'w') as output_file:
+        if file_location.endswith('.json'):
+            json.dump(records, output_file, indent=2)
+        else:
+            writer = csv.DictWriter(output_file, fieldnames=Result._fields)
+            writer.writeheader()
+            writer.writerows(records)
+
+
+def load_results(file_location):
+    with open(file_location, 'r') as input_file:
+        if file_location.endswith('.json'):
+            records = json.load(input_file)
+        else:
+            records = list(csv.DictReader(input_file))
+    results = {}
+    for record in records:
+        values = [record[field] for field in Result._fields]
+        # csv stores everything as text, empty for missing measurements
+        for i in range(1, 5):
+            if values[i] in ('', None):
+                values[i] = None
+            else:
+                values[i] = float(values[i])
+        results[record['instance']] = Result(*values)
+    return results
+
+
+def compare(results, baseline, maximize=False, time_tolerance=0.2, time_floor=0.1):
+    '''
+    Compares results against a baseline run
+
+    Args:
+        results: list of Result
+        baseline: dict of instance name to Result
+        maximize: True if a larger objective is better
+        time_tolerance: relative slowdown tolerated before reporting
+        time_floor: absolute slowdown in seconds tolerated before reporting,
+            keeps timer noise on millisecond instances out of the report
+
+    Returns:
+        list of regression messages, empty if none
+    '''
+    regressions = []
+    for r in results:
+        base = baseline.get(r.instance)
+        if base is None or base.status != 'ok':
+            continue
+        if r.status != 'ok':
+            regressions.append('{}: {} (baseline ok)'.format(r.instance, r.status))
+            continue
+        if r.wall_time > base.wall_time * (1 + time_tolerance) and \
+                r.wall_time - base.wall_time > time_floor:
+            regressions.append('{}: time {:.2f}s vs {:.2f}s'.format(r.instance, r.wall_time, base.wall_time))
+        worse = r.obj < base.obj if maximize else r.obj > base.obj
+        if worse:
+            regressions.append('{}: objective {} vs {}'.format(r.instance, r.obj, base.obj))
+    return regressions
+
+
+def print_table(results, baseline=None):
+    header = '{:<20} {:>10} {:>10} {:>16} {:>4} {:>8}'.format('instance', 'time(s)', 'rss(MB)', 'obj', 'opt', 'status')
+    if baseline is not None:
+        header += ' {:>10} {:>16}'.format('base(s)', 'base obj')
+    print(header)
+    for r in results:
+        line = '{:<20} {:>10.2f} {:>10} {:>16} {:>4} {:>8}'.format(
+            r.instance, r.wall_time,
+            '-' if r.peak_rss_mb is None else '{:.1f}'.format(r.peak_rss_mb),
+            '-' if r.obj is None else '{:.2f}'.format(r.obj),
+            '-' if r.opt is None else int(r.opt), r.status)
+        if baseline is not None:
+            base = baseline.get(r.instance)
+            if base is None or base.status != 'ok':
+                line += ' {:>10} {:>16}'.format('-', '-')
+            else:
+                line += ' {:>10.2f} {:>16.2f}'.format(base.wall_time, base.obj)
+        print(line)
+
+
+def main(args):
+    '''
+    Runs a week's solve_it over its data directory, prints a timing and
+    quality table, optionally saves it and compares it against a baseline
+
+    Args:
+        args: CLI arguments from an argparse parser
+
+    Returns:
+        process exit code, 1 if a regression against the baseline was found
+    '''
+    week_dir = args.week.rstrip('/')
+    name, _ = load_metadata(week_dir)
+    if args.instances:
+        input_files = [os.path.join('.', 'data', f) for f in args.instances]
+    else:
+        input_files = list_instances(week_dir, args.graded)
+
+    print('==\n== ' + name + ' Benchmark \n==')
+    results = []
+    for input_file in input_files:
+        result = run_instance(week_dir, input_file, args.solver, args.timeout)
+        print('{}: {:.2f}s {}'.format(result.instance, result.wall_time, result.status))
+        results.append(result)
+
+    baseline = load_results(args.baseline) if args.baseline and os.path.isfile(args.baseline) else None
+    print('')
+    print_table(results, baseline)
+
+    if args.output:
+        save_results(results, args.output)
+    if args.baseline and (baseline is None or args.update_baseline):
+        print('\nSaving baseline: ' + args.baseline)
+        save_results(results, args.baseline)
+        return 0
+
+    if baseline is not None:
+        regressions = compare(results, baseline, name in MAXIMIZE,
+                              args.time_tolerance, args.time_floor)
+        if regressions:
+            print('\n== Regressions')
+            for message in regressions:
+                print(message)
+            return 1
+        print('\n== No regressions against ' + args.baseline)
+    return 0
+
+
+import argparse
+def build_parser():
+    '''
+    Builds an argument parser for the CLI
+
+    Returns:
+        parser: an argparse parser
+    '''
+    parser = argparse.ArgumentParser(
+        description='''Runs an assignment's solve_it on every instance of its
+            data directory and records wall time, peak RSS, objective and
+            optimality flag.''')
+
+    parser.add_argument('week',
+        help='assignment directory, e.g. week-02-knapsack')
+
+    parser.add_argument('-g', '--graded', action='store_true',
+        help='only run the graded instances listed in the \'_coursera\' file')
+
+    parser.add_argument('-i', '--instances', nargs='+',
+        help='only run these file names from the data directory')
+
+    parser.add_argument('-s', '--solver', default='solver.py',
+        help='python source file containing solve_it')
+
+    parser.add_argument('-t', '--timeout', type=float,
+        help='seconds before a single instance is killed, solve_it gets them as its time_limit')
+
+    parser.add_argument('-o', '--output',
+        help='writes the results to this .csv or .json file')
+
+    parser.add_argument('-b', '--baseline',
+        help='.csv or .json baseline to compare against, created if missing')
+
+    parser.add_argument('-u', '--update_baseline', action='store_true',
+        help='overwrites the baseline with this run')
+
+    parser.add_argument('--time_tolerance', type=float, default=0.2,
+        help='relative slowdown tolerated before reporting a regression')
+
+    parser.add_argument('--time_floor', type=float, default=0.1,
+        help='absolute slowdown in seconds tolerated before reporting a regression')
+    return parser
+
+
+if __name__ == '__main__':
+    if len(sys.argv) in (4, 5) and sys.argv[1] == '--worker':
+        worker(sys.argv[2], sys.argv[3], float(sys.argv[4]) if len(sys.argv) == 5 else None)
+    else:
+        parser = build_parser()
+        sys.exit(main(parser.parse_args()))
@@ -1,31 +1,70 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-from collections import namedtuple
+from itertools import accumulate
 from operator import attrgetter
+from time import time
 
+import numpy as np
 from psutil import cpu_count
 from gurobipy import *
 
-Item = namedtuple("Item", ['index', 'value', 'weight', 'density'])
+class Item(object):
+    __slots__ = ['index', 'value', 'weight', 'density']
 
-def solve_it(input_data):
-    # Modify this code to run your optimization algorithm
+    def __init__(self, index, value, weight, density):
+        self.index = index
+        self.value = value
+        self.weight = weight
+        self.density = density
 
-    # parse the input
-    lines = input_data.split('\n')
 
-    firstLine = lines[0].split()
-    item_count = int(firstLine[0])
-    capacity = int(firstLine[1])
+class Items(object):
+    '''
+    struct-of-arrays item set with int value / weight columns and a float
+    density column, items[i] builds an Item record
+    '''
+    __slots__ = ['value', 'weight', 'density']
+
+    def __init__(self, value, weight):
+        self.value = np.ascontiguousarray(value, dtype=np.int64)
+        self.weight = np.ascontiguousarray(weight, dtype=np.int64)
+        self.density = self.value / self.weight
+
+    def __len__(self):
+        return len(self.value)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+        i = range(len(self))[i]
+        return Item(i, int(self.value[i]), int(self.weight[i]), float(self.density[i]))
+
+    def __iter__(self):
+        return map(Item, range(len(self)), self.value.tolist(), self.weight.tolist(), self.density.tolist())
+
+
+def parse_input(input_data):
+    # bulk parse every number in one pass
+    data = np.fromstring(input_data, dtype=np.int64, sep=' ')
+    item_count = int(data[0])
+    capacity = int(data[1])
+    columns = data[2:2 + 2 * item_count].reshape(item_count, 2)
+    return capacity, columns[:, 0], columns[:, 1]
+
+
+def format_solution(obj, opt, taken):
+    output_data = str(obj) + ' ' + str(opt) + '\n'
+    output_data += ' '.join(map(str, taken))
+    return output_data
+
 
-    items = []
+def solve_it(input_data, time_limit=None, callback=None):
+    # Modify this code to run your optimization algorithm
 
-    for i in range(1, item_count+1):
-        line = lines[i]
-        parts = line.split()
-        v, w = int(parts[0]), int(parts[1])
-        items.append(Item(i-1, v, w, 1.0 * v / w))
+    # parse the input
+    capacity, values, weights = parse_input(input_data)
+    items = Items(values, weights)
 
     # greedy solution
     # put items with higher value "density" first
@@ -36,15 +75,47 @@ def solve_it(input_data):
     # ==========
     # obj, taken = dp(capacity, items)
 
-    obj, opt, taken = mip(capacity, items)
+    # dynamic programming solution with a single value row and a bitset
+    # decision table, n * cap / 8 bytes of memory
+    # ==========
+    # obj, opt, taken = dp_bitset(capacity, items)
+
+    # divide-and-conquer dynamic programming solution
+    # linear memory in capacity, for capacities in the millions
+    # ==========
+    # obj, opt, taken = dp_hirschberg(capacity, items)
+
+    # sparse dynamic programming solution over Pareto-optimal states
+    # time proportional to the number of non-dominated (weight, value) pairs,
+    # every front is kept for the backtracking; once they hold state_limit
+    # states or time_limit runs out, as on the subset-sum-like ks_82_0, the
+    # rest of the time goes to branch and bound instead
+    # ==========
+    # obj, opt, taken = dp_pareto(capacity, items, time_limit=3600)
+
+    # branch and bound solution with linear relaxation bounds
+    # exact without a MIP solver, scales in items rather than capacity
+    # ==========
+    # obj, opt, taken = branch_and_bound(capacity, items, time_limit=3600)
+
+    # any of the solutions above on a reduced instance
+    # items forced in or out by reduced-cost bounds are fixed first
+    # ==========
+    # obj, opt, taken = solve_reduced(dp_hirschberg, capacity, items)
+
+    # report every incumbent found within the time limit
+    report = None
+    if callback:
+        report = lambda obj, opt, taken: callback(format_solution(obj, opt, taken))
+
+    obj, opt, taken = mip(capacity, items, time_limit=time_limit, callback=report)
 
     # prepare the solution in the specified output format
-    output_data = str(obj) + ' ' + str(opt) + '\n'
-    output_data += ' '.join(map(str, taken))
+    output_data = format_solution(obj, opt, taken)
     return output_data
 
 
-def mip(cap, items, verbose=False, num_threads=None):
+def mip(cap, items, verbose=False, num_threads=None, time_limit=None, callback=None):
     item_count = len(items)
     values = [item.value for item in items]
     weights = [item.weight for item in items]
@@ -56,12 +127,22 @@ def mip(cap, items, verbose=False, num_threads=None):
     else:
         m.setParam("Threads", cpu_count())
 
+    if time_limit:
+        m.setParam("TimeLimit", time_limit)
+
     x = m.addVars(item_count, vtype=GRB.BINARY, name="items")
-    m.setObjective(LinExpr(values, [x[i] for i in range(item_count)]), GRB.MAXIMIZE)
-    m.addConstr(LinExpr(weights, [x[i] for i in range(item_count)]), GRB.LESS_EQUAL, cap, name="capacity")
+    x_list = [x[i] for i in range(item_count)]
+    m.setObjective(LinExpr(values, x_list), GRB.MAXIMIZE)
+    m.addConstr(LinExpr(weights, x_list), GRB.LESS_EQUAL, cap, name="capacity")
+
+    def mipsol(model, where):
+        # hand every new incumbent to callback(obj, opt, taken)
+        if where == GRB.Callback.MIPSOL:
+            taken = [int(round(v)) for v in model.cbGetSolution(x_list)]
+            callback(int(round(model.cbGet(GRB.Callback.MIPSOL_OBJ))), 0, taken)
 
     m.update()
-    m.optimize()
+    m.optimize(mipsol if callback else None)
 
     if m.status == 2:
         opt = 1
@@ -100,6 +181,276 @@ def dp(cap, items):
     return values[-1][-1], 1, taken
 
 
+def dp_bitset(cap, items):
+    n = len(items)
+    taken = [0] * n
+    values = np.zeros(cap + 1, dtype=np.int64)
+    # decisions[i] is the packed take/skip bit of item i for every capacity
+    decisions = np.zeros((n, (cap + 8) // 8), dtype=np.uint8)
+    take = np.zeros(cap + 1, dtype=bool)
+    for i, item in enumerate(items):
+        weight = item.weight
+        if weight > cap:
+            continue
+        v_take = values[:cap + 1 - weight] + item.value
+        take[:weight] = False
+        np.greater(v_take, values[weight:], out=take[weight:])
+        np.maximum(values[weight:], v_take, out=values[weight:])
+        decisions[i] = np.packbits(take)
+
+    total_weight = cap
+    for i in reversed(range(n)):
+        if decisions[i, total_weight >> 3] >> (7 - (total_weight & 7)) & 1:
+            taken[i] = 1
+            total_weight -= items[i].weight
+
+    return int(values[-1]), 1, taken
+
+
+def dp_row(cap, items):
+    values = np.zeros(cap + 1, dtype=np.int64)
+    for item in items:
+        weight = item.weight
+        if weight > cap:
+            continue
+        np.maximum(values[weight:], values[:cap + 1 - weight] + item.value, out=values[weight:])
+    return values
+
+
+def dp_hirschberg(cap, items, table_limit=2 ** 26):
+    n = len(items)
+    taken = [0] * n
+
+    # (capacity, first item, end item) of the sub-problems left to reconstruct
+    stack = [(cap, 0, n)]
+    while stack:
+        sub_cap, start, end = stack.pop()
+        if end - start == 1 or (end - start) * (sub_cap + 1) // 8 <= table_limit:
+            # small enough to backtrack through a bitset decision table
+            _, _, sub_taken = dp_bitset(sub_cap, items[start:end])
+            taken[start:end] = sub_taken
+            continue
+
+        # best split of the capacity between the two halves of the items
+        mid = (start + end) // 2
+        forward = dp_row(sub_cap, items[start:mid])
+        backward = dp_row(sub_cap, items[mid:end])
+        split = int(np.argmax(forward + backward[::-1]))
+        stack.append((split, start, mid))
+        stack.append((sub_cap - split, mid, end))
+
+    value = sum(item.value for item, t in zip(items, taken) if t)
+    return value, 1, taken
+
+
+def dp_pareto(cap, items, time_limit=None, state_limit=2 ** 24):
+    n = len(items)
+    taken = [0] * n
+    order = sorted(items, key=attrgetter('density'), reverse=True)
+    t = time()
+    # a zero-value sentinel item closes the prefix sums for the bounds below
+    item_v = np.array([item.value for item in order] + [0], dtype=np.int64)
+    item_w = np.array([item.weight for item in order] + [1], dtype=np.int64)
+    prefix_v = np.concatenate(([0], np.cumsum(item_v)))
+    prefix_w = np.concatenate(([0], np.cumsum(item_w)))
+
+    # greedy lower bound in density order
+    lb_value, room = 0, cap
+    for item in order:
+        if item.weight <= room:
+            lb_value += item.value
+            room -= item.weight
+
+    # non-dominated states sorted by weight, values strictly increasing
+    weights = np.zeros(1, dtype=np.int64)
+    values = np.zeros(1, dtype=np.int64)
+    fronts = []
+    stored = 0
+    for k, item in enumerate(order):
+        # every front is kept for the backtracking, when densities are (nearly)
+        # equal the bound prunes little and the fronts outgrow the memory, such
+        # instances are left to branch and bound with the remaining time
+        stored += len(weights)
+        if stored + 2 * len(weights) > state_limit or \
+                (time_limit and time() - t >= time_limit):
+            if time_limit:
+                time_limit = max(time_limit - (time() - t), 1e-3)
+            return branch_and_bound(cap, items, time_limit=time_limit)
+        fronts.append((weights, values))
+        fits = np.searchsorted(weights, cap - item.weight, side='right')
+        merged_w = np.concatenate((weights, weights[:fits] + item.weight))
+        merged_v = np.concatenate((values, values[:fits] + item.value))
+
+        # stable sort of two sorted runs is a linear merge
+        merge = np.argsort(merged_w, kind='stable')
+        merged_w = merged_w[merge]
+        merged_v = merged_v[merge]
+
+        # drop states beaten by a lighter one, then equal weights but the last
+        keep = np.ones(len(merged_v), dtype=bool)
+        keep[1:] = merged_v[1:] > np.maximum.accumulate(merged_v)[:-1]
+        merged_w = merged_w[keep]
+        merged_v = merged_v[keep]
+        keep = np.ones(len(merged_w), dtype=bool)
+        keep[:-1] = merged_w[1:] != merged_w[:-1]
+        merged_w = merged_w[keep]
+        merged_v = merged_v[keep]
+
+        # drop states whose Dantzig bound over the remaining items cannot
+        # reach the lower bound, this keeps the fronts of large instances small
+        target = prefix_w[k + 1] + cap - merged_w
+        brk = np.minimum(np.searchsorted(prefix_w, target, side='right') - 1, n)
+        bound = merged_v + prefix_v[brk] - prefix_v[k + 1] + \
+            (target - prefix_w[brk]) * item_v[brk] // item_w[brk]
+        keep = bound >= lb_value
+        weights = merged_w[keep]
+        values = merged_v[keep]
+
+    # a state still present in the previous front means the item was skipped
+    total_weight, total_value = int(weights[-1]), int(values[-1])
+    for k in reversed(range(n)):
+        prev_w, prev_v = fronts[k]
+        j = np.searchsorted(prev_w, total_weight)
+        if j < len(prev_w) and prev_w[j] == total_weight and prev_v[j] == total_value:
+            continue
+        taken[order[k].index] = 1
+        total_weight -= order[k].weight
+        total_value -= order[k].value
+
+    return int(values[-1]), 1, taken
+
+
+def branch_and_bound(cap, items, time_limit=None):
+    n = len(items)
+    order = sorted(items, key=attrgetter('density'), reverse=True)
+    values = [item.value for item in order]
+    weights = [item.weight for item in order]
+    prefix_v = [0] + list(accumulate(values))
+    prefix_w = [0] + list(accumulate(weights))
+
+    best_value = 0
+    best_x = [0] * n
+    x = [0] * n
+    opt = 1
+    node_count = 0
+    t = time()
+
+    # node: (depth, room left, value so far, break item, item depth - 1 taken)
+    # the break item is the first item from depth on that does not fit when
+    # filling greedily in density order, it never moves backwards down a path
+    stack = [(0, cap, 0, 0, 0)]
+    while stack:
+        node_count += 1
+        if time_limit and node_count % 1024 == 0 and time() - t >= time_limit:
+            opt = 0
+            break
+
+        k, room, value, brk, take = stack.pop()
+        if k > 0:
+            x[k - 1] = take
+
+        target = prefix_w[k] + room
+        brk = max(brk, k)
+        while brk < n and prefix_w[brk + 1] <= target:
+            brk += 1
+
+        # greedy completion is feasible, keep it if it beats the incumbent
+        greedy_value = value + prefix_v[brk] - prefix_v[k]
+        if greedy_value > best_value:
+            best_value = greedy_value
+            best_x = x[:k] + [1] * (brk - k) + [0] * (n - brk)
+        if brk == n:
+            continue
+
+        # Dantzig bound: greedy completion plus a fraction of the break item
+        bound = greedy_value + (target - prefix_w[brk]) * values[brk] // weights[brk]
+        if bound <= best_value:
+            continue
+
+        stack.append((k + 1, room, value, brk, 0))
+        if brk > k:
+            stack.append((k + 1, room - weights[k], value + values[k], brk, 1))
+
+    taken = [0] * n
+    for item, x_i in zip(order, best_x):
+        taken[item.index] = x_i
+
+    return best_value, opt, taken
+
+
+def reduction(cap, items, core_size=None):
+    n = len(items)
+    order = sorted(items, key=attrgetter('density'), reverse=True)
+    prefix_v = [0] + list(accumulate(item.value for item in order))
+    prefix_w = [0] + list(accumulate(item.weight for item in order))
+    taken = [0] * n
+
+    # break item of the linear relaxation
+    brk = 0
+    while brk < n and prefix_w[brk + 1] <= cap:
+        brk += 1
+    if brk == n:
+        for item in items:
+            taken[item.index] = 1
+        return 0, [], taken, (prefix_v[n], list(taken)), True
+
+    # lower bound: break solution filled up with any later item that fits
+    lb_value, lb_taken = prefix_v[brk], list(taken)
+    room = cap - prefix_w[brk]
+    for p, item in enumerate(order):
+        if p < brk:
+            lb_taken[item.index] = 1
+        elif item.weight <= room:
+            lb_taken[item.index] = 1
+            lb_value += item.value
+            room -= item.weight
+
+    # flipping item j away from its LP value costs at least its reduced cost
+    # |v_j - r * w_j| with r the break density, all scaled by w_brk to stay in
+    # integers; j is fixed when the flipped bound cannot beat the lower bound
+    v_brk, w_brk = order[brk].value, order[brk].weight
+    lp_bound = prefix_v[brk] * w_brk + (cap - prefix_w[brk]) * v_brk
+    if core_size is None:
+        core_start, core_end = 0, n
+    else:
+        core_start = max(brk - core_size // 2, 0)
+        core_end = min(core_start + core_size, n)
+    exact = True
+    core = []
+    core_cap = cap
+    for p, item in enumerate(order):
+        if p == brk or \
+                lp_bound - abs(item.value * w_brk - v_brk * item.weight) >= (lb_value + 1) * w_brk:
+            if core_start <= p < core_end:
+                core.append(item)
+                continue
+            # heuristic core restriction, the optimum may be cut off
+            exact = False
+        if p < brk:
+            taken[item.index] = 1
+            core_cap -= item.weight
+
+    return core_cap, core, taken, (lb_value, lb_taken), exact
+
+
+def solve_reduced(solver, cap, items, core_size=None, **kwargs):
+    core_cap, core, taken, incumbent, exact = reduction(cap, items, core_size)
+    opt = 1
+    if core:
+        core_items = [Item(i, item.value, item.weight, item.density) for i, item in enumerate(core)]
+        _, opt, core_taken = solver(core_cap, core_items, **kwargs)
+        for item, x_i in zip(core, core_taken):
+            taken[item.index] = x_i
+
+    value = sum(item.value for item in items if taken[item.index])
+    if value < incumbent[0]:
+        value, taken = incumbent
+    if not exact:
+        opt = 0
+
+    return value, opt, taken
+
+
 def greedy(cap, items):
     n = len(items)
     taken = [0] * n
@@ -1,25 +1,36 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
+import numpy as np
 from psutil import cpu_count
 from gurobipy import *
 import networkx as nx
 
 
-def solve_it(input_data):
+def parse_input(input_data):
+    # bulk parse every number in one pass, one row per edge
+    data = np.fromstring(input_data, dtype=np.int64, sep=' ')
+    node_count = int(data[0])
+    edge_count = int(data[1])
+    edges = data[2:2 + 2 * edge_count].reshape(edge_count, 2)
+    return node_count, edges
+
+
+def format_solution(obj, opt, solution):
+    output_data = str(obj) + ' ' + str(opt) + '\n'
+    output_data += ' '.join(map(str, solution))
+    return output_data
+
+
+def solve_it(input_data, time_limit=None, callback=None):
     # Modify this code to run your optimization algorithm
     # parse the input
-    lines = input_data.split('\n')
-
-    first_line = lines[0].split()
-    node_count = int(first_line[0])
-    edge_count = int(first_line[1])
+    node_count, edges = parse_input(input_data)
 
-    edges = []
-    for i in range(1, edge_count + 1):
-        line = lines[i]
-        parts = line.split()
-        edges.append((int(parts[0]), int(parts[1])))
+    # report every incumbent found within the time limit
+    report = None
+    if callback:
+        report = lambda obj, opt, solution: callback(format_solution(obj, opt, solution))
 
     # trivial solution
     # every node has its own color
@@ -35,8 +46,9 @@ def solve_it(input_data):
         obj, opt, solution = mip(node_count, edges,
                                  verbose=False,
                                  num_threads=1,
-                                 time_limit=3600*4,
-                                 greedy_init=True)
+                                 time_limit=time_limit or 3600*4,
+                                 greedy_init=True,
+                                 callback=report)
     else:
         # greedy solution
         # try all greedy strategies provided by NetworkX and pick the best one
@@ -44,13 +56,12 @@ def solve_it(input_data):
         obj, opt, solution = greedy(node_count, edges)
 
     # prepare the solution in the specified output format
-    output_data = str(obj) + ' ' + str(opt) + '\n'
-    output_data += ' '.join(map(str, solution))
+    output_data = format_solution(obj, opt, solution)
 
     return output_data
 
 
-def mip(node_count, edges, verbose=False, num_threads=None, time_limit=None, greedy_init=False):
+def mip(node_count, edges, verbose=False, num_threads=None, time_limit=None, greedy_init=False, callback=None):
     m = Model("graph_coloring")
     m.setParam('OutputFlag', verbose)
     if num_threads:
@@ -62,6 +73,8 @@ def mip(node_count, edges, verbose=False, num_threads=None, time_limit=None, gre
         m.setParam("TimeLimit", time_limit)
 
     init_color_count, _, greedy_color = greedy(node_count, edges)
+    if callback:
+        callback(init_color_count, 0, greedy_color)
 
     colors = m.addVars(init_color_count, vtype=GRB.BINARY, name="colors")
     nodes = m.addVars(node_count, init_color_count, vtype=GRB.BINARY, name="assignments")
@@ -91,8 +104,8 @@ def mip(node_count, edges, verbose=False, num_threads=None, time_limit=None, gre
                  name="ieq2")
 
     # vertices sharing one edge have different colors
-    m.addConstrs((nodes[(edge[0], k)] + nodes[(edge[1], k)] <= 1
-                  for edge in edges
+    m.addConstrs((nodes[(u, k)] + nodes[(v, k)] <= 1
+                  for u, v in edges.tolist()
                   for k in range(init_color_count)),
                  name="ieq3")
 
@@ -101,8 +114,20 @@ def mip(node_count, edges, verbose=False, num_threads=None, time_limit=None, gre
                   for i in range(init_color_count - 1)),
                  name="ieq4")
 
+    node_vars = [nodes[(i, k)] for i in range(node_count) for k in range(init_color_count)]
+
+    def mipsol(model, where):
+        # hand every new incumbent to callback(obj, opt, solution), colors
+        # renumbered to 0..color_count-1
+        if where == GRB.Callback.MIPSOL:
+            isol = model.cbGetSolution(node_vars)
+            soln = [max(range(init_color_count), key=lambda k: isol[init_color_count * i + k])
+                    for i in range(node_count)]
+            relabel = {c: k for k, c in enumerate(sorted(set(soln)))}
+            callback(len(relabel), 0, [relabel[c] for c in soln])
+
     m.update()
-    m.optimize()
+    m.optimize(mipsol if callback else None)
 
     isol = [int(var.x) for var in m.getVars()]
     color_count = sum(isol[:init_color_count])
@@ -120,7 +145,7 @@ def mip(node_count, edges, verbose=False, num_threads=None, time_limit=None, gre
 def greedy(node_count, edges):
     graph = nx.Graph()
     graph.add_nodes_from(range(node_count))
-    graph.add_edges_from(edges)
+    graph.add_edges_from(edges.tolist())
 
     strategies = [nx.coloring.strategy_largest_first,
                   nx.coloring.strategy_random_sequential,
@@ -24,27 +24,89 @@
 # THE SOFTWARE.
 
 
-from collections import namedtuple
+import numpy as np
 from psutil import cpu_count
 from gurobipy import *
 
-Set = namedtuple("Set", ['index', 'cost', 'items'])
 
+class Set(object):
+    __slots__ = ['index', 'cost', 'items']
 
-def solve_it(input_data):
-    # Modify this code to run your optimization algorithm
+    def __init__(self, index, cost, items):
+        self.index = index
+        self.cost = cost
+        self.items = items
 
-    # parse the input
-    lines = input_data.split('\n')
 
+class Sets(object):
+    '''
+    struct-of-arrays set family with a float64 cost column and the items of
+    every set in CSR layout, sets[i] builds a Set record over a slice view
+    '''
+    __slots__ = ['cost', 'indptr', 'indices']
+
+    def __init__(self, cost, indptr, indices):
+        self.cost = np.ascontiguousarray(cost, dtype=np.float64)
+        self.indptr = np.ascontiguousarray(indptr, dtype=np.int64)
+        self.indices = np.ascontiguousarray(indices, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.cost)
+
+    def __getitem__(self, i):
+        i = range(len(self))[i]
+        return Set(i, float(self.cost[i]), self.indices[self.indptr[i]:self.indptr[i + 1]])
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+
+def parse_input(input_data):
+    '''
+    Parses a set cover instance into typed column arrays
+
+    Returns:
+        item count, set costs and the items of every set in CSR layout,
+        items of set i are indices[indptr[i]:indptr[i + 1]]
+    '''
+    lines = input_data.split('\n')
     parts = lines[0].split()
     item_count = int(parts[0])
     set_count = int(parts[1])
-    
-    sets = []
-    for i in range(1, set_count+1):
-        parts = lines[i].split()
-        sets.append(Set(i-1, float(parts[0]), set(map(int, parts[1:]))))
+
+    # bulk parse every number in one pass, line lengths split it into sets
+    set_lines = lines[1:set_count + 1]
+    lengths = np.fromiter(map(len, map(str.split, set_lines)), dtype=np.int64, count=set_count)
+    data = np.fromstring('\n'.join(set_lines), dtype=np.float64, sep=' ')
+
+    starts = np.zeros(set_count + 1, dtype=np.int64)
+    np.cumsum(lengths, out=starts[1:])
+    is_cost = np.zeros(len(data), dtype=bool)
+    is_cost[starts[:-1]] = True
+
+    costs = data[is_cost]
+    indices = data[~is_cost].astype(np.int64)
+    indptr = starts - np.arange(set_count + 1)
+    return item_count, costs, indptr, indices
+
+
+def format_solution(obj, opt, solution):
+    output_data = str(obj) + ' ' + str(opt) + '\n'
+    output_data += ' '.join(map(str, solution))
+    return output_data
+
+
+def solve_it(input_data, time_limit=None, callback=None):
+    # Modify this code to run your optimization algorithm
+
+    # parse the input
+    item_count, costs, indptr, indices = parse_input(input_data)
+    sets = Sets(costs, indptr, indices)
+
+    # report every incumbent found within the time limit
+    report = None
+    if callback:
+        report = lambda obj, opt, solution: callback(format_solution(obj, opt, solution))
 
     # trivial solution
     # pick add sets one-by-one until all the items are covered
@@ -56,34 +118,47 @@ def solve_it(input_data):
     # ==========
     obj, opt, solution = mip(item_count, sets,
                              verbose=False,
-                             time_limit=3600)
+                             time_limit=time_limit or 3600,
+                             callback=report)
 
     # calculate the cost of the solution
-    # obj = sum([s.cost*solution[s.index] for s in sets])
+    # obj = sets.cost @ solution
 
     # prepare the solution in the specified output format
-    output_data = str(obj) + ' ' + str(opt) + '\n'
-    output_data += ' '.join(map(str, solution))
+    output_data = format_solution(obj, opt, solution)
 
     return output_data
 
 
 def naive(item_count, sets):
     soln = [0] * len(sets)
-    covered = set()
+    covered = np.zeros(item_count, dtype=bool)
 
     for s in sets:
         soln[s.index] = 1
-        covered |= set(s.items)
-        if len(covered) >= item_count:
+        covered[s.items] = True
+        if np.count_nonzero(covered) >= item_count:
             break
 
-    value = int(sum(map(lambda s: s.cost * soln[s.index], sets)))
+    value = int(sets.cost @ soln)
 
     return value, 0, soln
 
 
-def mip(item_count, sets, verbose=False, num_threads=None, time_limit=None):
+def covering_sets(item_count, sets):
+    '''
+    Transposes the CSR set-to-items layout
+
+    Returns:
+        sets covering item j are covering[setptr[j]:setptr[j + 1]]
+    '''
+    set_of_entry = np.repeat(np.arange(len(sets)), np.diff(sets.indptr))
+    order = np.argsort(sets.indices, kind='stable')
+    setptr = np.searchsorted(sets.indices[order], np.arange(item_count + 1))
+    return setptr, set_of_entry[order]
+
+
+def mip(item_count, sets, verbose=False, num_threads=None, time_limit=None, callback=None):
     m = Model("set_covering")
     m.setParam('OutputFlag', verbose)
     if num_threads:
@@ -96,17 +171,27 @@ def mip(item_count, sets, verbose=False, num_threads=None, time_limit=None):
 
     selections = m.addVars(len(sets), vtype=GRB.BINARY, name="set_selection")
 
-    m.setObjective(LinExpr([s.cost for s in sets], [selections[i] for i in range(len(sets))]), GRB.MINIMIZE)
+    m.setObjective(LinExpr(sets.cost.tolist(), [selections[i] for i in range(len(sets))]), GRB.MINIMIZE)
 
-    m.addConstrs((LinExpr([1 if j in s.items else 0 for s in sets], [selections[i] for i in range(len(sets))]) >= 1
+    setptr, covering = covering_sets(item_count, sets)
+    covering = covering.tolist()
+    m.addConstrs((quicksum(selections[i] for i in covering[setptr[j]:setptr[j + 1]]) >= 1
                   for j in range(item_count)),
                  name="ieq1")
 
+    selection_list = [selections[i] for i in range(len(sets))]
+
+    def mipsol(model, where):
+        # hand every new incumbent to callback(obj, opt, solution)
+        if where == GRB.Callback.MIPSOL:
+            soln = [int(round(v)) for v in model.cbGetSolution(selection_list)]
+            callback(int(sets.cost @ soln), 0, soln)
+
     m.update()
-    m.optimize()
+    m.optimize(mipsol if callback else None)
 
     soln = [int(var.x) for var in m.getVars()]
-    total_cost = int(sum([sets[i].cost * soln[i] for i in range(len(sets))]))
+    total_cost = int(sets.cost @ soln)
 
     if m.status == 2:
         opt = 1
@@ -0,0 +1,109 @@
+from TwoOptSolver import *
+
+
+class LkSolver(TwoOptSolver):
+    """
+    Lin-Kernighan style variable-depth search, every step is a 2-opt move
+    that keeps t1 fixed and breaks the closing edge (t1, t2) of the previous
+    step, so the tour stays a valid cycle throughout the chain
+    """
+    MAX_DEPTH = 50
+    BREADTH = 5
+
+    def lk_candidates(self, t1, t2, gain, added):
+        """
+        :param t1: fixed end of the chain
+        :param t2: other end of the edge (t1, t2) being broken
+        :param gain: removed minus added length of the chain so far, including (t1, t2)
+        :param added: edges added by the chain, they are never broken again
+        :return: list of (priority, t3, t4), best first; (t2, t3) is added,
+            (t3, t4) is broken
+        """
+        dist = self.edge_length
+        forward = self.succ(t1) == t2
+        candidates = []
+        for t3 in self.neighbors[t2]:
+            d_23 = dist(t2, t3)
+            # positive gain criterion, neighbors are sorted by distance
+            if gain - d_23 <= self.CMP_THRESHOLD:
+                break
+            if t3 == t1:
+                continue
+            t4 = self.succ(t3, not forward)
+            if t4 == t2 or (t3, t4) in added or (t4, t3) in added:
+                continue
+            candidates.append((dist(t3, t4) - d_23, t3, t4))
+        candidates.sort(reverse=True)
+        return candidates
+
+    def improve_lk(self, t1):
+        """
+        :param t1: city whose edges start the chain
+        :return: cities touched by the applied chain, None if no improving chain
+        """
+        dist = self.edge_length
+        for forward in (True, False):
+            t2 = self.succ(t1, forward)
+            d_12 = dist(t1, t2)
+            # only the first step backtracks over alternatives
+            for _, t3, t4 in self.lk_candidates(t1, t2, d_12, ())[:self.BREADTH]:
+                moves = []
+                added = set()
+                gain = d_12
+                best_gain = self.CMP_THRESHOLD
+                best_depth = 0
+                last = t2
+                while True:
+                    # t1 last .. t4 t3 becomes t1 t4 .. last t3
+                    self.move_2opt(t1, last, t4, t3)
+                    moves.append((t1, last, t4, t3))
+                    added.add((last, t3))
+                    gain += dist(t3, t4) - dist(last, t3)
+                    last = t4
+                    closed = gain - dist(last, t1)
+                    if closed > best_gain:
+                        best_gain = closed
+                        best_depth = len(moves)
+                    if len(moves) >= self.MAX_DEPTH:
+                        break
+                    candidates = self.lk_candidates(t1, last, gain, added)
+                    if not candidates:
+                        break
+                    _, t3, t4 = candidates[0]
+
+                # roll back the steps after the best closed tour
+                while len(moves) > best_depth:
+                    a, b, c, d = moves.pop()
+                    self.move_2opt(a, c, b, d)
+                if moves:
+                    self.obj -= best_gain
+                    return {city for move in moves for city in move}
+        return None
+
+    def solve(self, t_threshold=None, callback=None, or_opt=True, seed=0, accept='better'):
+        """
+        :param t_threshold: time limit in seconds, the remaining time after the
+            first local optimum is spent on iterated local search
+        :param callback: called with the solution string of incumbents
+        :param or_opt: also try or-opt segment moves when no chain improves
+        :param seed: seed of the kicks
+        :param accept: acceptance criterion of the iterated local search
+        :return: solution string
+        """
+        t = time()
+        deadline = t + t_threshold if t_threshold else None
+        self.init_tour()
+        if len(self.tour) < 8:
+            return TwoOptSolver.solve(self, t_threshold, callback)
+
+        if or_opt:
+            improve = lambda a: self.improve_lk(a) or self.improve_or_opt(a)
+        else:
+            improve = self.improve_lk
+        self.descend(self.tour.cities(), improve, deadline, callback)
+
+        if deadline:
+            self.iterated_local_search(improve, deadline, callback, accept, seed=seed)
+
+        self.sync_cycle()
+        return self.__str__()
@@ -0,0 +1,218 @@
+import math
+
+
+def reverse_run(order, index, i, j, flags=None):
+    """
+    :param order: list holding a cyclic sequence
+    :param index: index[x] is the position of x in order, kept up to date
+    :param i: position of the first element of the run
+    :param j: position of the last element of the run
+    :param flags: list of booleans, toggled for every element of the reversed run
+
+    reverse the cyclic run order[i..j] in place, or the complementary run if
+    that is shorter, which gives the same cycle; at most len(order) / 2
+    elements move
+    """
+    n = len(order)
+    length = (j - i) % n + 1
+    if 2 * length > n:
+        i, j = (j + 1) % n, (i - 1) % n
+        length = n - length
+    if flags is not None:
+        for k in range(i, i + length):
+            x = order[k if k < n else k - n]
+            flags[x] = not flags[x]
+    for _ in range(length // 2):
+        x_i, x_j = order[i], order[j]
+        order[i] = x_j
+        index[x_j] = i
+        order[j] = x_i
+        index[x_i] = j
+        i += 1
+        if i == n:
+            i = 0
+        j -= 1
+        if j < 0:
+            j = n - 1
+
+
+class ArrayTour(object):
+    """
+    tour as an array of cities with a position index, next and prev are
+    O(1) and reverse is O(n)
+    """
+    def __init__(self, order):
+        """
+        :param order: cities in tour order
+        """
+        self.order = list(order)
+        self.pos = [0] * len(self.order)
+        for i, c in enumerate(self.order):
+            self.pos[c] = i
+
+    def __len__(self):
+        return len(self.order)
+
+    def cities(self):
+        return self.order[:]
+
+    def next(self, c):
+        i = self.pos[c] + 1
+        return self.order[i if i < len(self.order) else 0]
+
+    def prev(self, c):
+        return self.order[self.pos[c] - 1]
+
+    def between(self, a, b, c):
+        """
+        :return: True if b is on the path from a forward to c
+        """
+        i, j, k = self.pos[a], self.pos[b], self.pos[c]
+        if i <= k:
+            return i <= j <= k
+        return j >= i or j <= k
+
+    def reverse(self, a, b):
+        """
+        reverse the path from a forward to b
+        """
+        self.reverse_positions(self.pos[a], self.pos[b])
+
+    def reverse_positions(self, i, j):
+        reverse_run(self.order, self.pos, i, j)
+
+
+class TwoLevelTour(object):
+    """
+    tour as a cyclic list of blocks of about sqrt(n) cities, each block with
+    its own reversal bit; next and prev are O(1), between is O(1) and reverse
+    is O(sqrt(n)) amortized, it splits at most two blocks and flips the bits
+    of the blocks in between
+    """
+    def __init__(self, order, block_size=None):
+        """
+        :param order: cities in tour order
+        :param block_size: cities per block after a rebuild, sqrt(n) if None
+        """
+        n = len(order)
+        self.block_size = block_size or max(8, int(math.sqrt(n)))
+        # block and raw index of every city
+        self.blk = [0] * n
+        self.idx = [0] * n
+        self.build(order)
+
+    def build(self, order):
+        size = self.block_size
+        self.items = [list(order[i:i + size]) for i in range(0, len(order), size)]
+        self.rev = [False] * len(self.items)
+        # blocks in tour order, and the position of every block in it
+        self.blocks = list(range(len(self.items)))
+        self.block_pos = list(range(len(self.items)))
+        # splits add blocks, the list is rebuilt once they have doubled
+        self.max_blocks = 2 * len(self.items) + 2
+        for b, items in enumerate(self.items):
+            for i, c in enumerate(items):
+                self.blk[c] = b
+                self.idx[c] = i
+
+    def __len__(self):
+        return len(self.blk)
+
+    def cities(self):
+        order = []
+        for b in self.blocks:
+            order.extend(reversed(self.items[b]) if self.rev[b] else self.items[b])
+        return order
+
+    def next(self, c):
+        b = self.blk[c]
+        items = self.items[b]
+        if self.rev[b]:
+            i = self.idx[c] - 1
+            if i >= 0:
+                return items[i]
+        else:
+            i = self.idx[c] + 1
+            if i < len(items):
+                return items[i]
+        p = self.block_pos[b] + 1
+        b = self.blocks[p if p < len(self.blocks) else 0]
+        return self.items[b][-1] if self.rev[b] else self.items[b][0]
+
+    def prev(self, c):
+        b = self.blk[c]
+        items = self.items[b]
+        if self.rev[b]:
+            i = self.idx[c] + 1
+            if i < len(items):
+                return items[i]
+        else:
+            i = self.idx[c] - 1
+            if i >= 0:
+                return items[i]
+        b = self.blocks[self.block_pos[b] - 1]
+        return self.items[b][0] if self.rev[b] else self.items[b][-1]
+
+    def sequence(self, c):
+        """
+        :return: key of c that increases along the tour from the first block
+        """
+        b = self.blk[c]
+        i = self.idx[c]
+        return self.block_pos[b], len(self.items[b]) - 1 - i if self.rev[b] else i
+
+    def between(self, a, b, c):
+        """
+        :return: True if b is on the path from a forward to c
+        """
+        i, j, k = self.sequence(a), self.sequence(b), self.sequence(c)
+        if i <= k:
+            return i <= j <= k
+        return j >= i or j <= k
+
+    def split_before(self, c):
+        """
+        make c the first city of its block, the cities before it in the block
+        move to a new block
+        """
+        b = self.blk[c]
+        items = self.items[b]
+        i = self.idx[c]
+        if self.rev[b]:
+            if i == len(items) - 1:
+                return
+            head = items[i + 1:]
+            del items[i + 1:]
+            for k, city in enumerate(head):
+                self.idx[city] = k
+        else:
+            if i == 0:
+                return
+            head = items[:i]
+            del items[:i]
+            for k, city in enumerate(items):
+                self.idx[city] = k
+        new = len(self.items)
+        self.items.append(head)
+        self.rev.append(self.rev[b])
+        self.block_pos.append(0)
+        for city in head:
+            self.blk[city] = new
+        p = self.block_pos[b]
+        self.blocks.insert(p, new)
+        for k in range(p, len(self.blocks)):
+            self.block_pos[self.blocks[k]] = k
+
+    def reverse(self, a, b):
+        """
+        reverse the path from a forward to b
+        """
+        after = self.next(b)
+        if a == b or after == a:
+            return
+        self.split_before(a)
+        self.split_before(after)
+        reverse_run(self.blocks, self.block_pos,
+                    self.block_pos[self.blk[a]], self.block_pos[self.blk[b]], self.rev)
+        if len(self.blocks) > self.max_blocks:
+            self.build(self.cities())
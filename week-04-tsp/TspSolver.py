@@ -1,12 +1,171 @@
 import math
+import numpy as np
+from time import time
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+class Point(object):
+    __slots__ = ['x', 'y']
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return "Point(x={}, y={})".format(self.x, self.y)
+
+
+class Points(object):
+    """
+    struct-of-arrays point set with contiguous float64 x / y columns
+
+    points[i] builds a Point record for code written against single points,
+    loops over many points should index the columns instead
+    """
+    __slots__ = ['x', 'y']
+
+    def __init__(self, x, y):
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, i):
+        return Point(float(self.x[i]), float(self.y[i]))
+
+    def __iter__(self):
+        return map(Point, self.x.tolist(), self.y.tolist())
+
+
+def hilbert_index(x, y, order):
+    """
+    :param x: int array of grid columns in [0, 2 ** order)
+    :param y: int array of grid rows in [0, 2 ** order)
+    :param order: bits per coordinate
+    :return: int array, position of every cell along the hilbert curve
+    """
+    side = 1 << order
+    x, y = x.copy(), y.copy()
+    d = np.zeros(len(x), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant so the sub curve starts and ends correctly
+        flip = ~ry & rx
+        x[flip] = side - 1 - x[flip]
+        y[flip] = side - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap]
+        s >>= 1
+    return d
+
+
+class SpatialGrid(object):
+    """
+    uniform grid of square cells holding about two cities each, for nearest
+    neighbor queries over a shrinking set of cities
+    """
+    def __init__(self, xs, ys, cities):
+        """
+        :param xs: x coordinate of every city
+        :param ys: y coordinate of every city
+        :param cities: cities initially in the grid
+        """
+        self.xs, self.ys = xs, ys
+        self.x0 = min(xs[c] for c in cities)
+        self.y0 = min(ys[c] for c in cities)
+        width = max(xs[c] for c in cities) - self.x0
+        height = max(ys[c] for c in cities) - self.y0
+        side = max(1, int(math.sqrt(len(cities) / 2)))
+        self.cell_size = max(width, height) / side or 1.0
+        self.nx = int(width / self.cell_size) + 1
+        self.ny = int(height / self.cell_size) + 1
+        self.cells = [[] for _ in range(self.nx * self.ny)]
+        for c in cities:
+            self.cells[self.cell(c)].append(c)
+
+    def cell(self, c):
+        i = min(int((self.xs[c] - self.x0) / self.cell_size), self.nx - 1)
+        j = min(int((self.ys[c] - self.y0) / self.cell_size), self.ny - 1)
+        return j * self.nx + i
+
+    def remove(self, c):
+        self.cells[self.cell(c)].remove(c)
+
+    def nearest(self, c):
+        """
+        :return: city in the grid nearest to c, None if the grid is empty
+        """
+        x, y = self.xs[c], self.ys[c]
+        ci = min(int((x - self.x0) / self.cell_size), self.nx - 1)
+        cj = min(int((y - self.y0) / self.cell_size), self.ny - 1)
+        best, best_dist = None, math.inf
+        for r in range(max(self.nx, self.ny)):
+            # cells of ring r are at least (r - 1) cells away from c
+            if best is not None and best_dist <= (r - 1) * self.cell_size:
+                break
+            for j in range(max(cj - r, 0), min(cj + r, self.ny - 1) + 1):
+                step = 1 if j in (cj - r, cj + r) else 2 * r
+                for i in range(ci - r, ci + r + 1, max(step, 1)):
+                    if i < 0 or i >= self.nx:
+                        continue
+                    for other in self.cells[j * self.nx + i]:
+                        d = math.hypot(self.xs[other] - x, self.ys[other] - y)
+                        if d < best_dist:
+                            best, best_dist = other, d
+        return best
 
 
 class TspSolver(object):
-    def __init__(self, points):
+    # largest instance for which the n x n distance matrix is cached
+    MATRIX_MAX_POINTS = 3000
+    # candidate neighbors kept per city
+    NEIGHBOR_COUNT = 10
+    # largest instance whose local search tour is a plain array
+    TOUR_ARRAY_MAX_POINTS = 10000
+
+    def __init__(self, points, backend=None, neighbor_count=None, tour_backend=None):
+        """
+        :param points: Points, or a list of objects with x / y attributes
+        :param backend: 'matrix' caches all pairwise distances, 'kdtree' only
+            builds neighbor lists, chosen by instance size if None
+        :param neighbor_count: length of the candidate neighbor lists
+        :param tour_backend: 'array' or 'two_level' tour used by local search,
+            chosen by instance size if None
+        """
         self.CMP_THRESHOLD = 10 ** -6
+        if not isinstance(points, Points):
+            points = Points([p.x for p in points], [p.y for p in points])
         self.points = points
+        # scalar lookups on python lists beat numpy element access
+        self.xs = points.x.tolist()
+        self.ys = points.y.tolist()
+
+        if backend is None:
+            backend = 'matrix' if len(points) <= self.MATRIX_MAX_POINTS else 'kdtree'
+        self.backend = backend
+        self.dist = None
+        if backend == 'matrix':
+            self.dist = self.distance_matrix()
+            # bound ndarray.item is the cheapest scalar lookup into the matrix
+            self.edge_length = self.dist.item
+        self.neighbors = self.nearest_neighbors(neighbor_count or self.NEIGHBOR_COUNT)
+        if tour_backend is None:
+            tour_backend = 'array' if len(points) <= self.TOUR_ARRAY_MAX_POINTS else 'two_level'
+        self.tour_backend = tour_backend
+
         self.cycle = list(range(len(points))) + [0]
         self.obj = self.cycle_length()
+        # seconds between two incumbents reported through a callback
+        self.report_interval = 1
+        self.t_report = None
 
     def __str__(self):
         obj = self.cycle_length()
@@ -17,6 +176,23 @@ class TspSolver(object):
         output_str += ' '.join(map(str, self.cycle[:-1]))
         return output_str
 
+    def report(self, callback, force=False):
+        """
+        :param callback: called with the solution string of the current cycle
+        :param force: report even if the last report is more recent than
+            report_interval
+
+        formatting a large tour is O(n), so reports are throttled
+        """
+        if callback is None:
+            return
+        if force or self.report_due():
+            callback(self.__str__())
+            self.t_report = time()
+
+    def report_due(self):
+        return self.t_report is None or time() - self.t_report >= self.report_interval
+
     @staticmethod
     def point_dist(p1, p2):
         return math.sqrt((p1.x - p2.x) ** 2 + (p1.y - p2.y) ** 2)
@@ -25,12 +201,49 @@ class TspSolver(object):
         return len(set(self.cycle[:-1])) == len(self.points) == len(self.cycle[:-1])
 
     def edge_length(self, v1, v2):
-        p1 = self.points[v1]
-        p2 = self.points[v2]
-        return self.point_dist(p1, p2)
+        return math.hypot(self.xs[v1] - self.xs[v2], self.ys[v1] - self.ys[v2])
+
+    def distance_matrix(self):
+        x, y = self.points.x, self.points.y
+        return np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+
+    def nearest_neighbors(self, k):
+        """
+        :param k: number of neighbors per city
+        :return: list of lists, the k nearest other cities of every city
+            sorted by distance
+        """
+        n = len(self.points)
+        k = min(k, n - 1)
+        if k <= 0:
+            return [[] for _ in range(n)]
+        coords = np.column_stack((self.points.x, self.points.y))
+
+        if self.dist is not None:
+            dist = self.dist.copy()
+            np.fill_diagonal(dist, np.inf)
+            nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(dist, nearest, axis=1), axis=1)
+            return np.take_along_axis(nearest, order, axis=1).tolist()
+
+        if cKDTree is not None:
+            _, nearest = cKDTree(coords).query(coords, k + 1)
+        else:
+            # brute force in row blocks that keep the distance block small
+            nearest = np.empty((n, k + 1), dtype=np.int64)
+            block = max(1, 2 ** 24 // n)
+            for start in range(0, n, block):
+                d = np.hypot(coords[start:start + block, 0, None] - coords[None, :, 0],
+                             coords[start:start + block, 1, None] - coords[None, :, 1])
+                part = np.argpartition(d, k, axis=1)[:, :k + 1]
+                order = np.argsort(np.take_along_axis(d, part, axis=1), axis=1)
+                nearest[start:start + block] = np.take_along_axis(part, order, axis=1)
+        # the city itself is usually first, but not with duplicate points
+        return [[j for j in row if j != i][:k] for i, row in enumerate(nearest.tolist())]
 
     def cycle_length(self):
-        return sum(self.edge_length(v1, v2) for v1, v2 in zip(self.cycle[:-1], self.cycle[1:]))
+        cycle = np.array(self.cycle)
+        return float(np.hypot(np.diff(self.points.x[cycle]), np.diff(self.points.y[cycle])).sum())
 
     def greedy(self):
         cycle = [0]
@@ -50,3 +263,96 @@ class TspSolver(object):
         self.cycle = cycle
         self.obj = self.cycle_length()
         return self.__str__()
+
+    def set_tour(self, order):
+        self.cycle = list(order) + [order[0]]
+        self.obj = self.cycle_length()
+        return self.__str__()
+
+    def space_filling_curve(self, order=16):
+        """
+        :param order: bits per coordinate of the hilbert grid
+        :return: solution string, cities visited along a hilbert curve
+        """
+        x, y = self.points.x, self.points.y
+        scale = (2 ** order - 1) / max(np.ptp(x), np.ptp(y), self.CMP_THRESHOLD)
+        gx = ((x - x.min()) * scale).astype(np.int64)
+        gy = ((y - y.min()) * scale).astype(np.int64)
+        return self.set_tour(np.argsort(hilbert_index(gx, gy, order), kind='stable').tolist())
+
+    def nearest_neighbor_grid(self, start=0):
+        """
+        :param start: first city
+        :return: solution string, the nearest neighbor tour with the nearest
+            unvisited city found on a spatial grid instead of a full scan
+        """
+        n = len(self.points)
+        grid = SpatialGrid(self.xs, self.ys, range(n))
+        cycle = [start]
+        grid.remove(start)
+        for _ in range(n - 1):
+            city = grid.nearest(cycle[-1])
+            grid.remove(city)
+            cycle.append(city)
+        return self.set_tour(cycle)
+
+    def greedy_edge(self):
+        """
+        :return: solution string
+
+        adds candidate edges shortest first whenever both ends have degree
+        below two and no subtour closes, then joins the resulting fragments
+        nearest end first
+        """
+        n = len(self.points)
+        if n < 3:
+            return self.set_tour(list(range(n)))
+        u = np.repeat(np.arange(n), [len(row) for row in self.neighbors])
+        v = np.fromiter((c for row in self.neighbors for c in row), dtype=np.int64, count=len(u))
+        keep = u < v
+        u, v = u[keep], v[keep]
+        length = np.hypot(self.points.x[u] - self.points.x[v], self.points.y[u] - self.points.y[v])
+        order = np.argsort(length, kind='stable')
+
+        degree = [0] * n
+        adj = [[] for _ in range(n)]
+        # union find over fragments
+        parent = list(range(n))
+
+        def find(c):
+            while parent[c] != c:
+                parent[c] = parent[parent[c]]
+                c = parent[c]
+            return c
+
+        for a, b in zip(u[order].tolist(), v[order].tolist()):
+            if degree[a] == 2 or degree[b] == 2:
+                continue
+            root_a, root_b = find(a), find(b)
+            if root_a == root_b:
+                continue
+            parent[root_a] = root_b
+            degree[a] += 1
+            degree[b] += 1
+            adj[a].append(b)
+            adj[b].append(a)
+
+        # fragment ends, a city of degree 0 is a fragment of its own
+        ends = [c for c in range(n) if degree[c] < 2]
+        grid = SpatialGrid(self.xs, self.ys, ends)
+        cycle = []
+        city = ends[0]
+        while city is not None:
+            grid.remove(city)
+            # walk the fragment from this end to the other one
+            prev = None
+            while True:
+                cycle.append(city)
+                nexts = [c for c in adj[city] if c != prev]
+                if not nexts:
+                    break
+                prev, city = city, nexts[0]
+            if prev is not None:
+                grid.remove(city)
+            city = grid.nearest(city)
+        return self.set_tour(cycle)
@@ -1,32 +1,422 @@
 from TspSolver import *
+from Tour import *
 from itertools import combinations
+from collections import deque
 from time import time
+import random
 
 
 class TwoOptSolver(TspSolver):
+    # shortest and longest segment cut out by an iterated local search kick
+    KICK_SEGMENT = (10, 50)
+
+    def init_tour(self, order=None, backend=None):
+        """
+        :param order: cities in tour order, the current cycle if None
+        :param backend: 'array' or 'two_level', self.tour_backend if None
+        """
+        if order is None:
+            order = self.cycle[:-1]
+        if (backend or self.tour_backend) == 'two_level':
+            self.tour = TwoLevelTour(order)
+        else:
+            self.tour = ArrayTour(order)
+        self.next = self.tour.next
+        self.prev = self.tour.prev
+        # 2-opt moves applied since the last kick, None when not recorded
+        self.journal = None
+
+    def sync_cycle(self):
+        order = self.tour.cities()
+        self.cycle = order + [order[0]]
+
     def swap(self, start, end):
-        improved = False
-        new_cycle = self.cycle[:start] + self.cycle[start:end + 1][::-1] + self.cycle[end + 1:]
-        new_obj = self.obj - \
-                     (self.edge_length(self.cycle[start - 1], self.cycle[start]) +
-                      self.edge_length(self.cycle[end], self.cycle[(end + 1)])) + \
-                     (self.edge_length(new_cycle[start - 1], new_cycle[start]) +
-                      self.edge_length(new_cycle[end], new_cycle[(end + 1)]))
-        if new_obj < self.obj - self.CMP_THRESHOLD:
-            self.cycle = new_cycle
-            self.obj = new_obj
-            improved = True
-        return improved
-
-    def solve(self, t_threshold=None):
+        """
+        :param start: position of the first city of the segment
+        :param end: position of the last city of the segment
+        :return: True if improved
+
+        2-opt move replacing edges (a, b), (c, d) by (a, c), (b, d), where
+        b..c is tour[start..end]; the delta comes from the four endpoints
+        only, and the tour is changed only if the move improves it
+        """
+        order = self.tour.order
+        a = order[start - 1]
+        b = order[start]
+        c = order[end]
+        d = order[(end + 1) % len(order)]
+        delta = self.edge_length(a, c) + self.edge_length(b, d) - \
+            self.edge_length(a, b) - self.edge_length(c, d)
+        if delta < -self.CMP_THRESHOLD:
+            self.tour.reverse_positions(start, end)
+            self.obj += delta
+            return True
+        return False
+
+    def succ(self, c, forward=True):
+        """
+        :return: city after c, or before c if not forward
+        """
+        return self.next(c) if forward else self.prev(c)
+
+    def move_2opt(self, a, b, c, d):
+        """
+        replace edges (a, b), (c, d) by (a, c), (b, d), where the cycle reads
+        a b ... c d in one of the two directions
+        """
+        if self.next(a) == b:
+            self.tour.reverse(b, c)
+        else:
+            self.tour.reverse(c, b)
+        if self.journal is not None:
+            self.journal.append((a, b, c, d))
+
+    def undo(self, moves):
+        """
+        :param moves: 2-opt moves as recorded in the journal, taken back last first
+        """
+        journal, self.journal = self.journal, None
+        for a, b, c, d in reversed(moves):
+            self.move_2opt(a, c, b, d)
+        self.journal = journal
+
+    def redo(self, moves):
+        journal, self.journal = self.journal, None
+        for move in moves:
+            self.move_2opt(*move)
+        self.journal = journal
+
+    def move_segment(self, p, s1, s2, nx, c, e, reversed_insert):
+        """
+        or-opt move, the cycle reads p s1 .. s2 nx .. c e in one direction and
+        becomes p nx .. c s1 .. s2 e, or p nx .. c s2 .. s1 e if
+        reversed_insert; done as two or three 2-opt moves
+        """
+        self.move_2opt(p, s1, c, e)
+        if c != nx:
+            self.move_2opt(p, c, nx, s2)
+        if not reversed_insert:
+            self.move_2opt(c, s2, s1, e)
+
+    def improve_2opt(self, a):
+        """
+        :param a: city whose edges are tried for removal
+        :return: cities touched by the first improving 2-opt move, None if none
+        """
+        dist = self.edge_length
+        for forward in (True, False):
+            b = self.succ(a, forward)
+            d_ab = dist(a, b)
+            for c in self.neighbors[a]:
+                d_ac = dist(a, c)
+                # the new edge (a, c) must be shorter than the removed (a, b)
+                if d_ac >= d_ab:
+                    break
+                d = self.succ(c, forward)
+                if c == b or d == a:
+                    continue
+                delta = d_ac + dist(b, d) - d_ab - dist(c, d)
+                if delta < -self.CMP_THRESHOLD:
+                    # replace (a, b), (c, d) with (a, c), (b, d)
+                    self.move_2opt(a, b, c, d)
+                    self.obj += delta
+                    return a, b, c, d
+        return None
+
+    def improve_or_opt(self, a, max_length=3):
+        """
+        :param a: first city of the segment to move
+        :param max_length: longest segment tried
+        :return: cities touched by the first improving or-opt move, None if none
+
+        moves the segment of 1 to max_length cities starting at a next to one
+        of a's candidate neighbors, in either orientation; this is the
+        segment insertion subset of 3-opt, every delta comes from six edges
+        """
+        dist = self.edge_length
+        if len(self.tour) < 2 * max_length + 2:
+            return None
+        for forward in (True, False):
+            p = self.succ(a, not forward)
+            s2 = a
+            segment = [a]
+            for _ in range(max_length):
+                nx = self.succ(s2, forward)
+                # gain of cutting the segment out and closing the gap
+                removed = dist(p, a) + dist(s2, nx) - dist(p, nx)
+                for c in self.neighbors[a]:
+                    d_ac = dist(a, c)
+                    if d_ac >= removed:
+                        break
+                    if c in segment:
+                        continue
+                    # c a .. s2 e, keeping the orientation
+                    e = self.succ(c, forward)
+                    if c != p and e not in segment and e != p:
+                        delta = d_ac + dist(s2, e) - dist(c, e) - removed
+                        if delta < -self.CMP_THRESHOLD:
+                            self.move_segment(p, a, s2, nx, c, e, False)
+                            self.obj += delta
+                            return p, a, s2, nx, c, e
+                    # e s2 .. a c, reversed
+                    e = self.succ(c, not forward)
+                    if e != p and e not in segment and c != p:
+                        delta = d_ac + dist(s2, e) - dist(c, e) - removed
+                        if delta < -self.CMP_THRESHOLD:
+                            self.move_segment(p, a, s2, nx, e, c, True)
+                            self.obj += delta
+                            return p, a, s2, nx, c, e
+                s2 = nx
+                segment.append(s2)
+        return None
+
+    def solve(self, t_threshold=None, callback=None, neighbor_lists=False, or_opt=False,
+              vectorized=False, iterated=False, accept='better'):
+        """
+        :param t_threshold: time limit in seconds
+        :param callback: called with the solution string of incumbents
+        :param neighbor_lists: only try moves that connect a city to one of
+            its candidate neighbors, driven by don't-look bits
+        :param or_opt: also try or-opt segment moves, needs neighbor_lists
+        :param vectorized: best improvement per first edge, every second edge
+            scored at once with numpy; suits 500 to 2000 cities
+        :param iterated: spend the time left after the local optimum on
+            iterated local search, needs neighbor_lists and t_threshold
+        :param accept: acceptance criterion of the iterated local search
+        :return: solution string
+        """
+        if neighbor_lists:
+            return self.solve_neighbor_lists(t_threshold, callback, or_opt, iterated, accept)
+        if vectorized:
+            return self.solve_vectorized(t_threshold, callback)
+
+        # positional moves need the array tour
+        self.init_tour(backend='array')
         improved = True
         t = time()
         while improved:
             if t_threshold and time() - t >= t_threshold:
                 break
             improved = False
-            for start, end in combinations(range(1, len(self.cycle) - 1), 2):
+            for start, end in combinations(range(1, len(self.tour.order)), 2):
                 if self.swap(start, end):
                     improved = True
+                    if callback and self.report_due():
+                        self.sync_cycle()
+                        self.report(callback)
+                    break
+                if t_threshold and time() - t >= t_threshold:
+                    break
+        self.sync_cycle()
+        return self.__str__()
+
+    def solve_vectorized(self, t_threshold=None, callback=None):
+        t = time()
+        order = np.array(self.cycle[:-1], dtype=np.int64)
+        n = len(order)
+        x = self.points.x[order]
+        y = self.points.y[order]
+        # edge i joins position i and i + 1
+        edge = np.hypot(np.roll(x, -1) - x, np.roll(y, -1) - y)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(n - 2):
+                if t_threshold and time() - t >= t_threshold:
+                    improved = False
                     break
+                # second edges j = i + 2 .. n - 1, edge n - 1 touches edge 0
+                end = n if i > 0 else n - 1
+                cx, cy = x[i + 2:end], y[i + 2:end]
+                dx = np.append(x[i + 3:end], x[0]) if end == n else x[i + 3:end + 1]
+                dy = np.append(y[i + 3:end], y[0]) if end == n else y[i + 3:end + 1]
+                delta = np.hypot(cx - x[i], cy - y[i]) + np.hypot(dx - x[i + 1], dy - y[i + 1]) - \
+                    edge[i + 2:end] - edge[i]
+                if len(delta) == 0:
+                    continue
+                k = int(np.argmin(delta))
+                if delta[k] < -self.CMP_THRESHOLD:
+                    # reverse positions i + 1 .. j
+                    j = i + 2 + k
+                    order[i + 1:j + 1] = order[i + 1:j + 1][::-1].copy()
+                    x[i + 1:j + 1] = x[i + 1:j + 1][::-1].copy()
+                    y[i + 1:j + 1] = y[i + 1:j + 1][::-1].copy()
+                    edge[i + 1:j] = edge[i + 1:j][::-1].copy()
+                    edge[i] = math.hypot(x[i + 1] - x[i], y[i + 1] - y[i])
+                    edge[j] = math.hypot(x[(j + 1) % n] - x[j], y[(j + 1) % n] - y[j])
+                    self.obj += float(delta[k])
+                    improved = True
+                    if callback and self.report_due():
+                        self.cycle = order.tolist() + [int(order[0])]
+                        self.report(callback)
+        self.cycle = order.tolist() + [int(order[0])]
+        return self.__str__()
+
+    def solve_neighbor_lists(self, t_threshold=None, callback=None, or_opt=False,
+                             iterated=False, accept='better', seed=0):
+        t = time()
+        deadline = t + t_threshold if t_threshold else None
+        self.init_tour()
+        if len(self.tour) < 4:
+            return self.__str__()
+
+        if or_opt:
+            improve = lambda a: self.improve_2opt(a) or self.improve_or_opt(a)
+        else:
+            improve = self.improve_2opt
+        self.descend(self.tour.cities(), improve, deadline, callback)
+        if iterated and deadline and len(self.tour) >= 8:
+            self.iterated_local_search(improve, deadline, callback, accept, seed=seed)
+        self.sync_cycle()
         return self.__str__()
+
+    def iterated_local_search(self, improve, deadline, callback=None, accept='better',
+                              temperature=0.05, seed=0):
+        """
+        :param improve: move function of descend
+        :param deadline: time() at which the search stops
+        :param callback: called with the solution string of new best tours
+        :param accept: 'better' keeps a kicked tour only if it is shorter,
+            'equal' also if it is as long, 'anneal' also if it is longer with
+            probability exp(-delta / T)
+        :param temperature: T of 'anneal' as a fraction of the average edge
+        :param seed: seed of the kicks
+
+        kicks the local optimum with a double bridge whose two inner segments
+        are KICK_SEGMENT cities long, starting at a random city, and descends
+        again from the six touched cities only; a rejected kick is undone from
+        the journal, so an iteration costs only the moves it made. A descent
+        that brings back the three edges the kick broke doubles the segment
+        length of the next kick, up to a quarter of the tour
+        """
+        rng = random.Random(seed)
+        n = len(self.tour)
+        low, high = self.KICK_SEGMENT
+        high = max(2, min(high, n // 4))
+        low = min(low, high)
+        longest = high
+        best_obj = self.obj
+        # None while the current tour is the best one
+        best_order = None
+        while time() < deadline:
+            before = self.obj
+            self.journal = []
+            a = rng.randrange(n)
+            b = self.walk(a, rng.randint(low, longest))
+            c = self.walk(b, rng.randint(low, longest))
+            touched = self.double_bridge(rng, (a, b, c))
+            self.descend(touched, improve, deadline)
+            moves, self.journal = self.journal, None
+
+            if abs(self.obj - before) <= self.CMP_THRESHOLD and self.restored(touched):
+                # the descent undid the kick, kick harder instead of counting it
+                self.undo(moves)
+                self.obj = before
+                longest = min(2 * longest, n // 4)
+                continue
+            longest = high
+
+            delta = self.obj - before
+            if accept == 'anneal':
+                t = temperature * best_obj / n
+                accepted = delta <= self.CMP_THRESHOLD or rng.random() < math.exp(-delta / t)
+            elif accept == 'equal':
+                accepted = delta <= self.CMP_THRESHOLD
+            else:
+                accepted = delta < -self.CMP_THRESHOLD
+            if not accepted:
+                self.undo(moves)
+                self.obj = before
+                continue
+
+            if self.obj < best_obj - self.CMP_THRESHOLD:
+                best_obj = self.obj
+                best_order = None
+                if callback and self.report_due():
+                    self.sync_cycle()
+                    self.report(callback)
+            elif best_order is None and self.obj > best_obj + self.CMP_THRESHOLD:
+                # leaving the best tour, keep a copy of it
+                self.undo(moves)
+                best_order = self.tour.cities()
+                self.redo(moves)
+
+        if best_order is not None:
+            self.init_tour(best_order)
+            self.obj = best_obj
+
+    def descend(self, cities, improve, deadline=None, callback=None):
+        """
+        :param cities: cities whose don't-look bit starts off
+        :param improve: tries moves around a city, returns the touched cities
+            of an applied move or None
+        :param deadline: time() after which the search stops
+        :param callback: called with the solution string of incumbents
+        :return: True if a local optimum was reached before the deadline
+        """
+        # cities whose don't-look bit is off, in the order they are examined
+        queue = deque(cities)
+        queued = [False] * len(self.tour)
+        for city in queue:
+            queued[city] = True
+        n_checks = 0
+        while queue:
+            n_checks += 1
+            if deadline and n_checks % 256 == 0 and time() >= deadline:
+                return False
+            a = queue.popleft()
+            queued[a] = False
+
+            touched = improve(a)
+            if touched is None:
+                continue
+            for city in touched:
+                if not queued[city]:
+                    queue.append(city)
+                    queued[city] = True
+            if callback and self.report_due():
+                self.sync_cycle()
+                self.report(callback)
+        return True
+
+    def restored(self, touched):
+        """
+        :param touched: cities returned by double_bridge
+        :return: True if the three edges the double bridge broke are back
+        """
+        a1, b0, b1, c0, c1, d0 = touched
+        return all(self.next(x) == y or self.prev(x) == y
+                   for x, y in ((a1, b0), (b1, c0), (c1, d0)))
+
+    def walk(self, c, steps):
+        """
+        :return: city steps positions after c along the tour
+        """
+        for _ in range(steps):
+            c = self.next(c)
+        return c
+
+    def double_bridge(self, rng, cities=None):
+        """
+        :param rng: random.Random used to pick the cut points
+        :param cities: three distinct cities ending the first three segments,
+            picked at random if None
+        :return: the cities at the ends of the six changed edges
+
+        kick the tour A B C D into A C B D, a move 2-opt and or-opt cannot
+        undo in one step; done as three 2-opt moves so it works on any tour
+        """
+        a1, b1, c1 = cities or rng.sample(range(len(self.tour)), 3)
+        if not self.tour.between(a1, b1, c1):
+            b1, c1 = c1, b1
+        b0, c0, d0 = self.next(a1), self.next(b1), self.next(c1)
+        dist = self.edge_length
+        self.obj += dist(a1, c0) + dist(c1, b0) + dist(b1, d0) - \
+            dist(a1, b0) - dist(b1, c0) - dist(c1, d0)
+        # a1 b0 .. b1 c0 .. c1 d0 -> a1 c1 .. c0 b1 .. b0 d0
+        self.move_2opt(a1, b0, c1, d0)
+        # -> a1 c0 .. c1 b1 .. b0 d0
+        self.move_2opt(a1, c1, c0, b1)
+        # -> a1 c0 .. c1 b0 .. b1 d0
+        self.move_2opt(c1, b1, b0, d0)
+        return a1, b0, b1, c0, c1, d0
@@ -2,12 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import math
+import random
 import itertools
-from collections import namedtuple
+import numpy as np
+from time import time
 from TwoOptSolver import *
-
-Point = namedtuple("Point", ['x', 'y'])
-
+from LkSolver import *
 
 def edge_length(point1, point2):
     return math.sqrt((point1.x - point2.x) ** 2 + (point1.y - point2.y) ** 2)
@@ -17,29 +17,140 @@ def cycle_length(cycle, points):
     return sum(edge_length(points[cycle[i - 1]], points[cycle[i]]) for i in range(len(cycle)))
 
 
-def solve_it(input_data):
+def parse_input(input_data):
+    # bulk parse every number in one pass, one (x, y) row per point
+    data = np.fromstring(input_data, dtype=np.float64, sep=' ')
+    point_count = int(data[0])
+    return data[1:1 + 2 * point_count].reshape(point_count, 2)
+
+
+def format_solution(obj, cycle):
+    return '{:.2f} {}\n'.format(obj, 0) + ' '.join(map(str, cycle[:-1]))
+
+
+# coordinates and incumbent queue shared by the multi start workers, set by attach_coords
+shared = {}
+
+
+def attach_coords(name, shape, queue=None):
+    """
+    pool initializer, maps the (2, n) coordinate block created by multi_start
+    and keeps the queue the workers stream their incumbents to
+    """
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    # keep the handle alive as long as the array view
+    shared['shm'] = shm
+    shared['coords'] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    shared['queue'] = queue
+
+
+def multi_start_worker(seed, deadline=None, kicks=10):
+    """
+    :param seed: 0 starts from the greedy edge tour, other seeds first apply
+        kicks random double bridges to it
+    :param deadline: time() at which the search stops, the pool startup and
+        the construction of the start tour are spent from the same budget
+    :param kicks: double bridges of a perturbed start
+    :return: (obj, cycle)
+    """
+    coords = shared['coords']
+    queue = shared.get('queue')
+    callback = queue.put if queue is not None else None
+    solver = LkSolver(Points(coords[0], coords[1]))
+    solver.greedy_edge()
+    if seed and len(solver.points) >= 8:
+        solver.init_tour()
+        rng = random.Random(seed)
+        for _ in range(kicks):
+            solver.double_bridge(rng)
+        solver.sync_cycle()
+    solver.report(callback, force=True)
+    # a falsy t_threshold means no limit, an exhausted budget still stops
+    t_threshold = max(deadline - time(), 1e-3) if deadline else None
+    solver.solve(t_threshold=t_threshold, callback=callback, seed=seed)
+    return solver.obj, solver.cycle
+
+
+def multi_start(coords, num_workers, time_limit=None, callback=None, kicks=10):
+    """
+    :param coords: (n, 2) array of city coordinates
+    :param num_workers: worker processes, one start each
+    :param time_limit: seconds from this call until every worker stops
+    :param callback: called with the solution string of every new global best
+    :param kicks: double bridges of a perturbed start
+    :return: solution string of the best tour over all starts
+
+    the coordinates are copied once into shared memory instead of being
+    pickled to every worker, the workers stream their incumbents back
+    through a queue while they search
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait
+    from multiprocessing import Queue, shared_memory
+    from queue import Empty
+
+    deadline = time() + time_limit if time_limit else None
+    block = np.ascontiguousarray(coords.T)
+    shm = shared_memory.SharedMemory(create=True, size=block.nbytes)
+    queue = Queue()
+    best = {'obj': None, 'output': None}
+
+    def offer(obj, output):
+        if best['obj'] is None or obj < best['obj']:
+            best['obj'], best['output'] = obj, output
+            if callback:
+                callback(output)
+
+    try:
+        np.ndarray(block.shape, dtype=np.float64, buffer=shm.buf)[:] = block
+        with ProcessPoolExecutor(num_workers, initializer=attach_coords,
+                                 initargs=(shm.name, block.shape, queue)) as pool:
+            pending = {pool.submit(multi_start_worker, seed, deadline, kicks)
+                       for seed in range(num_workers)}
+            while pending:
+                done, pending = wait(pending, timeout=0.1)
+                try:
+                    while True:
+                        output = queue.get_nowait()
+                        offer(float(output.split(None, 1)[0]), output)
+                except Empty:
+                    pass
+                for future in done:
+                    obj, cycle = future.result()
+                    offer(obj, format_solution(obj, cycle))
+    finally:
+        queue.close()
+        shm.close()
+        shm.unlink()
+    return best['output']
+
+
+def solve_it(input_data, time_limit=None, callback=None, num_workers=1):
     # Modify this code to run your optimization algorithm
 
     # parse the input
-    lines = input_data.split('\n')
+    coords = parse_input(input_data)
+    points = Points(coords[:, 0], coords[:, 1])
 
-    point_count = int(lines[0])
+    # independent perturbed starts in worker processes, keeps the best tour
+    if num_workers > 1:
+        return multi_start(coords, num_workers, time_limit, callback)
 
-    points = []
-    for i in range(1, point_count+1):
-        line = lines[i]
-        parts = line.split()
-        points.append(Point(float(parts[0]), float(parts[1])))
+    # lin-kernighan style solution from a greedy edge tour, restarts until time_limit
+    solver = LkSolver(points)
+    solver.greedy_edge()
+    # solver.space_filling_curve()
+    # solver.nearest_neighbor_grid()
+    output_data = solver.solve(t_threshold=time_limit, callback=callback)
 
-    # 2-opt solution
-    solver = TwoOptSolver(points)
+    # 2-opt and or-opt solution over candidate neighbor lists
+    # solver = TwoOptSolver(points)
+    # solver.greedy_edge()
+    # output_data = solver.solve(t_threshold=time_limit, callback=callback, neighbor_lists=True, or_opt=True)
 
     # k-opt solution
     # obj, opt, solution = k_opt(points, 3, time_limit=3600)
 
-    # prepare the solution in the specified output format
-    output_data = solver.solve()
-
     return output_data
 
 
@@ -105,7 +216,8 @@ if __name__ == '__main__':
         file_location = sys.argv[1].strip()
         with open(file_location, 'r') as input_data_file:
             input_data = input_data_file.read()
-        print(solve_it(input_data))
+        num_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+        print(solve_it(input_data, num_workers=num_workers))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/tsp_51_1)')
 
@@ -4,37 +4,131 @@
 import math
 import numpy as np
 from psutil import cpu_count
-from collections import namedtuple
 from gurobipy import *
 
-Point = namedtuple("Point", ['x', 'y'])
-Facility = namedtuple("Facility", ['index', 'setup_cost', 'capacity', 'location'])
-Customer = namedtuple("Customer", ['index', 'demand', 'location'])
+
+class Point(object):
+    __slots__ = ['x', 'y']
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Facility(object):
+    __slots__ = ['index', 'setup_cost', 'capacity', 'location']
+
+    def __init__(self, index, setup_cost, capacity, location):
+        self.index = index
+        self.setup_cost = setup_cost
+        self.capacity = capacity
+        self.location = location
+
+
+class Customer(object):
+    __slots__ = ['index', 'demand', 'location']
+
+    def __init__(self, index, demand, location):
+        self.index = index
+        self.demand = demand
+        self.location = location
+
+
+class Facilities(object):
+    '''
+    struct-of-arrays facility set, facilities[i] builds a Facility record
+    '''
+    __slots__ = ['setup_cost', 'capacity', 'x', 'y']
+
+    def __init__(self, setup_cost, capacity, x, y):
+        self.setup_cost = np.ascontiguousarray(setup_cost, dtype=np.float64)
+        self.capacity = np.ascontiguousarray(capacity, dtype=np.int64)
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.setup_cost)
+
+    def __getitem__(self, i):
+        i = range(len(self))[i]
+        return Facility(i, float(self.setup_cost[i]), int(self.capacity[i]),
+                        Point(float(self.x[i]), float(self.y[i])))
+
+    def __iter__(self):
+        return map(Facility, range(len(self)), self.setup_cost.tolist(), self.capacity.tolist(),
+                   map(Point, self.x.tolist(), self.y.tolist()))
+
+
+class Customers(object):
+    '''
+    struct-of-arrays customer set, customers[i] builds a Customer record
+    '''
+    __slots__ = ['demand', 'x', 'y']
+
+    def __init__(self, demand, x, y):
+        self.demand = np.ascontiguousarray(demand, dtype=np.int64)
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.demand)
+
+    def __getitem__(self, i):
+        i = range(len(self))[i]
+        return Customer(i, int(self.demand[i]), Point(float(self.x[i]), float(self.y[i])))
+
+    def __iter__(self):
+        return map(Customer, range(len(self)), self.demand.tolist(),
+                   map(Point, self.x.tolist(), self.y.tolist()))
 
 
 def dist(p1, p2):
     return math.sqrt((p1.x - p2.x) ** 2 + (p1.y - p2.y) ** 2)
 
 
-def solve_it(input_data):
+def dist_matrix(facilities, customers):
+    # customer by facility distances in one vectorized pass
+    return np.hypot(customers.x[:, None] - facilities.x[None, :],
+                    customers.y[:, None] - facilities.y[None, :])
+
+
+def parse_input(input_data):
+    '''
+    Parses a facility location instance into typed column arrays
+
+    Returns:
+        setup costs, capacities and (x, y) rows of the facilities,
+        demands and (x, y) rows of the customers
+    '''
+    # bulk parse every number in one pass
+    data = np.fromstring(input_data, dtype=np.float64, sep=' ')
+    facility_count = int(data[0])
+    customer_count = int(data[1])
+    f_end = 2 + 4 * facility_count
+    f_data = data[2:f_end].reshape(facility_count, 4)
+    c_data = data[f_end:f_end + 3 * customer_count].reshape(customer_count, 3)
+    return f_data[:, 0], f_data[:, 1].astype(np.int64), f_data[:, 2:], \
+        c_data[:, 0].astype(np.int64), c_data[:, 1:]
+
+
+def format_solution(obj, opt, solution):
+    output_data = '%.2f' % obj + ' ' + str(opt) + '\n'
+    output_data += ' '.join(map(str, solution))
+    return output_data
+
+
+def solve_it(input_data, time_limit=None, callback=None):
     # Modify this code to run your optimization algorithm
 
     # parse the input
-    lines = input_data.split('\n')
-
-    parts = lines[0].split()
-    facility_count = int(parts[0])
-    customer_count = int(parts[1])
-    
-    facilities = []
-    for i in range(1, facility_count+1):
-        parts = lines[i].split()
-        facilities.append(Facility(i-1, float(parts[0]), int(parts[1]), Point(float(parts[2]), float(parts[3])) ))
-
-    customers = []
-    for i in range(facility_count+1, facility_count+1+customer_count):
-        parts = lines[i].split()
-        customers.append(Customer(i-1-facility_count, int(parts[0]), Point(float(parts[1]), float(parts[2]))))
+    setup_costs, capacities, f_locations, demands, c_locations = parse_input(input_data)
+    facilities = Facilities(setup_costs, capacities, f_locations[:, 0], f_locations[:, 1])
+    customers = Customers(demands, c_locations[:, 0], c_locations[:, 1])
+
+    # report every incumbent found within the time limit
+    report = None
+    if callback:
+        report = lambda obj, opt, solution: callback(format_solution(obj, opt, solution))
 
     # trivial solution
     # pack the facilities one by one until all the customers are served
@@ -43,16 +137,16 @@ def solve_it(input_data):
 
     obj, opt, solution = mip(facilities, customers,
                              verbose=False,
-                             time_limit=1800)
+                             time_limit=time_limit or 1800,
+                             callback=report)
 
     # prepare the solution in the specified output format
-    output_data = '%.2f' % obj + ' ' + str(opt) + '\n'
-    output_data += ' '.join(map(str, solution))
+    output_data = format_solution(obj, opt, solution)
 
     return output_data
 
 
-def mip(facilities, customers, verbose=False, num_threads=None, time_limit=None):
+def mip(facilities, customers, verbose=False, num_threads=None, time_limit=None, callback=None):
     f_count = len(facilities)
     c_count = len(customers)
 
@@ -69,9 +163,11 @@ def mip(facilities, customers, verbose=False, num_threads=None, time_limit=None)
     x = m.addVars(f_count, vtype=GRB.BINARY, name="x")
     y = m.addVars(c_count, f_count, vtype=GRB.BINARY, name="y")
 
-    m.setObjective(LinExpr((facilities[j].setup_cost, x[j])
+    setup_costs = facilities.setup_cost.tolist()
+    dists = dist_matrix(facilities, customers).tolist()
+    m.setObjective(LinExpr((setup_costs[j], x[j])
                            for j in range(f_count)) +
-                   LinExpr((dist(customers[i].location, facilities[j].location), y[(i, j)])
+                   LinExpr((dists[i][j], y[(i, j)])
                            for i in range(c_count)
                            for j in range(f_count)),
                    GRB.MINIMIZE)
@@ -85,13 +181,24 @@ def mip(facilities, customers, verbose=False, num_threads=None, time_limit=None)
                   for j in range(f_count)),
                  name="xy_corr_constr")
 
-    m.addConstrs((LinExpr((customers[i].demand, y[(i, j)])
-                          for i in range(c_count)) <= facilities[j].capacity
+    demands = customers.demand.tolist()
+    capacities = facilities.capacity.tolist()
+    m.addConstrs((LinExpr((demands[i], y[(i, j)])
+                          for i in range(c_count)) <= capacities[j]
                   for j in range(f_count)),
                  name="cap_constr")
 
+    y_list = [y[(i, j)] for i in range(c_count) for j in range(f_count)]
+
+    def mipsol(model, where):
+        # hand every new incumbent to callback(obj, opt, solution)
+        if where == GRB.Callback.MIPSOL:
+            ysol = model.cbGetSolution(y_list)
+            soln = [max(range(f_count), key=lambda j: ysol[f_count * i + j]) for i in range(c_count)]
+            callback(model.cbGet(GRB.Callback.MIPSOL_OBJ), 0, soln)
+
     m.update()
-    m.optimize()
+    m.optimize(mipsol if callback else None)
 
     total_cost = m.getObjective().getValue()
     isol = [[int(m.getVarByName("y[{},{}]".format(i, j)).x)
@@ -109,27 +216,26 @@ def mip(facilities, customers, verbose=False, num_threads=None, time_limit=None)
 
 def trivial(facilities, customers):
     solution = [-1] * len(customers)
-    capacity_remaining = [f.capacity for f in facilities]
+    capacity_remaining = facilities.capacity.tolist()
     facility_index = 0
-    for customer in customers:
-        if capacity_remaining[facility_index] >= customer.demand:
-            solution[customer.index] = facility_index
-            capacity_remaining[facility_index] -= customer.demand
+    for index, demand in enumerate(customers.demand.tolist()):
+        if capacity_remaining[facility_index] >= demand:
+            solution[index] = facility_index
+            capacity_remaining[facility_index] -= demand
         else:
             facility_index += 1
-            assert capacity_remaining[facility_index] >= customer.demand
-            solution[customer.index] = facility_index
-            capacity_remaining[facility_index] -= customer.demand
+            assert capacity_remaining[facility_index] >= demand
+            solution[index] = facility_index
+            capacity_remaining[facility_index] -= demand
 
-    used = [0]*len(facilities)
-    for facility_index in solution:
-        used[facility_index] = 1
+    assigned = np.array(solution)
+    used = np.zeros(len(facilities), dtype=bool)
+    used[assigned] = True
 
-    obj = sum([f.setup_cost*used[f.index] for f in facilities])
-    for customer in customers:
-        obj += dist(customer.location, facilities[solution[customer.index]].location)
+    obj = facilities.setup_cost[used].sum()
+    obj += np.hypot(customers.x - facilities.x[assigned], customers.y - facilities.y[assigned]).sum()
 
-    return obj, 0, solution
+    return float(obj), 0, solution
 
 
 if __name__ == '__main__':
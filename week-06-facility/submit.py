@@ -7,6 +7,7 @@ import json
 import time
 import os
 from collections import namedtuple
+from multiprocessing import Process, Pipe
 
 
 # Python 2/3 compatibility
@@ -39,6 +40,12 @@ submitt_url = \
 Metadata = namedtuple("Metadata", ['assignment_key', 'name', 'part_data'])
 Part = namedtuple("Part", ['id', 'input_file', 'solver_file', 'name'])
 
+# time.clock was removed in Python 3.8
+clock = getattr(time, 'perf_counter', None) or time.clock
+
+# seconds a worker may overrun its time limit before it is stopped
+time_limit_grace = 10
+
 
 def load_metadata(metadata_file_name='_coursera'):
     '''
@@ -129,7 +136,7 @@ def part_prompt(problems):
         return selected_problems
 
 
-def compute(metadata, solver_file_override=None):
+def compute(metadata, solver_file_override=None, num_workers=1, time_limit=None):
     '''
     Determines which assignment parts the student would like to submit.
     Then computes his/her answers to those assignment parts
@@ -138,6 +145,10 @@ def compute(metadata, solver_file_override=None):
         metadata:  the assignment metadata
         solver_file_override:  an optional model file to override the metadata 
             default
+        num_workers:  number of assignment parts computed at the same time, 
+            each in its own worker process
+        time_limit:  wall clock budget in seconds for every part, passed to 
+            solve_it, parts still running after it return their incumbent
 
     Returns:
         a dictionary of results in the format Coursera expects
@@ -153,6 +164,7 @@ def compute(metadata, solver_file_override=None):
     #submission needs empty dict for every assignment part
     results.update({prob_data.id : {} for prob_data in metadata.part_data})
 
+    jobs = []
     for problem in selected_problems:
         if solver_file_override != None:
             solver_file = solver_file_override
@@ -162,29 +174,162 @@ def compute(metadata, solver_file_override=None):
         if not os.path.isfile(solver_file):
             print('Unable to locate assignment file "%s" in the current working directory.' % solver_file)
             continue
+        jobs.append((problem, solver_file))
 
-        submission = output(problem.input_file, solver_file)
+    if num_workers > 1 or time_limit:
+        submissions = compute_parallel(jobs, num_workers, time_limit)
+    else:
+        submissions = {problem.id: output(problem.input_file, solver_file)
+                       for problem, solver_file in jobs}
+
+    for problem_id, submission in submissions.items():
         if submission != None:
-            results[problem.id] = {'output':submission}
+            results[problem_id] = {'output':submission}
 
     print('\n== Computations Complete ...')
 
     return results
 
 
+def output_worker(input_file, solver_file, conn, time_limit=None):
+    '''
+    Runs output() in a worker process.  Every incumbent the solver reports 
+    is sent through conn as ('incumbent', submission), the final result as 
+    ('final', submission), None if the solver could not be run
+    '''
+    start = clock()
+
+    def send_incumbent(solution):
+        conn.send(('incumbent', solution.strip() + '\n' + str(clock() - start)))
+
+    try:
+        submission = output(input_file, solver_file, time_limit, send_incumbent)
+    except SystemExit:
+        submission = None
+    conn.send(('final', submission))
+    conn.close()
+
+
+def receive_results(problem_id, conn, submissions, incumbents):
+    '''
+    Reads every message a worker has sent so far
+
+    Args:
+        problem_id:  the id of the part the worker computes
+        conn:  the receiving end of the worker's pipe
+        submissions:  dictionary of problem ids to final submissions
+        incumbents:  dictionary of problem ids to the last reported incumbents
+
+    Returns:
+        True if the final submission was received
+    '''
+    try:
+        while conn.poll():
+            kind, submission = conn.recv()
+            if kind == 'incumbent':
+                incumbents[problem_id] = submission
+            else:
+                submissions[problem_id] = submission
+                return True
+    except EOFError:
+        pass
+    return False
+
+
+def compute_parallel(jobs, num_workers, time_limit=None):
+    '''
+    Computes assignment parts in separate worker processes, at most 
+    num_workers of them at the same time
+
+    Args:
+        jobs:  a list of (problem, solver_file) pairs
+        num_workers:  the number of worker processes
+        time_limit:  wall clock budget in seconds handed to every solve_it, 
+            a part still running time_limit_grace seconds later is stopped 
+            and its last reported incumbent is used
+
+    Returns:
+        a dictionary of problem ids to submissions, None for parts that 
+        failed or ran out of time without an incumbent
+    '''
+    pending = list(jobs)
+    running = {}
+    submissions = {}
+    incumbents = {}
+
+    while pending or running:
+        while pending and len(running) < max(num_workers, 1):
+            problem, solver_file = pending.pop(0)
+            parent_conn, child_conn = Pipe(duplex=False)
+            worker = Process(target=output_worker,
+                             args=(problem.input_file, solver_file, child_conn, time_limit))
+            worker.start()
+            child_conn.close()
+            running[problem.id] = (problem, worker, parent_conn, time.time())
+            print('Started: ' + problem.name)
+
+        for problem_id, (problem, worker, conn, start) in list(running.items()):
+            if receive_results(problem_id, conn, submissions, incumbents):
+                pass
+            elif not worker.is_alive():
+                # the worker may have sent its result and exited after the poll
+                if not receive_results(problem_id, conn, submissions, incumbents):
+                    print('Worker for %s exited without a result' % problem.name)
+                    submissions[problem_id] = incumbents.get(problem_id)
+            elif time_limit and time.time() - start >= time_limit + time_limit_grace:
+                print('Time limit reached: ' + problem.name)
+                worker.terminate()
+                submissions[problem_id] = incumbents.get(problem_id)
+                if submissions[problem_id] != None:
+                    print('Submitting incumbent: ')
+                    print(submissions[problem_id])
+            else:
+                continue
+            worker.join()
+            conn.close()
+            del running[problem_id]
+            print('Finished: ' + problem.name)
+
+        time.sleep(0.05)
+
+    return submissions
+
+
+def solve_it_kwargs(solve_it, time_limit=None, callback=None):
+    '''
+    Returns:
+        the time_limit / callback keyword arguments that solve_it accepts
+    '''
+    try:
+        from inspect import signature
+        params = signature(solve_it).parameters
+    except ImportError:
+        from inspect import getargspec
+        params = getargspec(solve_it).args
+    kwargs = {}
+    if time_limit and 'time_limit' in params:
+        kwargs['time_limit'] = time_limit
+    if callback and 'callback' in params:
+        kwargs['callback'] = callback
+    return kwargs
+
+
 def load_input_data(file_location):
     with open(file_location, 'r') as input_data_file:
         input_data = ''.join(input_data_file.readlines())
     return input_data
 
 
-def output(input_file, solver_file):
+def output(input_file, solver_file, time_limit=None, callback=None):
     '''
     Attempts to execute solve_it locally on a given input file.
 
     Args:
         input_file: the assignment problem data of interest
         solver_file: a python file containing the solve_it function
+        time_limit: wall clock budget in seconds passed on to solve_it
+        callback: passed on to solve_it, called with the solution string 
+            of every incumbent the solver finds
 
     Returns:
         the submission string in a format that the grader expects
@@ -203,9 +348,10 @@ def output(input_file, solver_file):
 
     solution = ''
 
-    start = time.clock()
+    start = clock()
     try:
-        solution = pkg.solve_it(load_input_data(input_file))
+        kwargs = solve_it_kwargs(pkg.solve_it, time_limit, callback)
+        solution = pkg.solve_it(load_input_data(input_file), **kwargs)
     except Exception as e:
         print('the solve_it(input_data) method from solver.py raised an exception')
         print('try testing it with python ./solver.py before running this submission script')
@@ -213,7 +359,7 @@ def output(input_file, solver_file):
         print(str(e))
         print('')
         return 'Local Exception =('
-    end = time.clock()
+    end = clock()
 
     if not isinstance(solution, str):
         print('Warning: the submitted solution was not ASCII and will be converted.  Some information may be lost.')
@@ -375,7 +521,7 @@ def main(args):
     print('==\n== '+metadata.name+' Solution Submission \n==')
     
     # compute dialog
-    results = compute(metadata, args.override)
+    results = compute(metadata, args.override, args.parallel, args.time_limit)
 
     if sum(['output' in v for k,v in results.items()]) <= 0:
         return
@@ -437,6 +583,12 @@ def build_parser():
 
     parser.add_argument('-rs', '--record_submission', 
         help='records the submission(s) as files', action='store_true')
+
+    parser.add_argument('-p', '--parallel', type=int, default=1,
+        help='computes up to this many assignment parts at the same time in worker processes')
+
+    parser.add_argument('-t', '--time_limit', type=float,
+        help='wall clock budget in seconds for each assignment part, the best solution found so far is submitted when it runs out')
     return parser
 
 
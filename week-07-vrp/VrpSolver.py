@@ -1,18 +1,49 @@
 import math
+import heapq
+import random
 import itertools
+from itertools import accumulate
 from time import time
+import numpy as np
 
 
 class VrpSolver(object):
-    def __init__(self, customers, vehicle_count, vehicle_capacity):
+    # nearest other customers kept per customer for granular neighborhoods
+    NEIGHBOR_COUNT = 10
+    # neighborhoods of the 'vnd' policy, cheapest first
+    VND_ORDER = ['exchange', 'shift', 'ladder', 'interchange']
+
+    def __init__(self, customers, vehicle_count, vehicle_capacity, neighbor_count=None, init='greedy'):
+        """
+        :param customers: Customers, the depot first
+        :param vehicle_count: number of vehicles
+        :param vehicle_capacity: capacity of every vehicle
+        :param neighbor_count: length of the granular candidate lists
+        :param init: initial solution, 'greedy', 'savings' or 'sweep'
+        """
         self.CMP_THRESHOLD = 10 ** -6
         self.customers = customers
         assert self.customers[0].demand == 0
+        # scalar lookups on python lists beat numpy element access
+        self.demands = customers.demand.tolist()
+        self.xs = customers.x.tolist()
+        self.ys = customers.y.tolist()
         self.c_ct = len(customers)
         self.v_ct = vehicle_count
         self.v_cap = vehicle_capacity
+        x, y = customers.x, customers.y
+        self.dist_matrix = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+        # bound ndarray.item is the cheapest scalar lookup into the matrix
+        self.edge_length = self.dist_matrix.item
+        self.neighbors = self.nearest_neighbors(neighbor_count or self.NEIGHBOR_COUNT)
+        # tour index and position of every customer, kept up to date by commit
+        self.route = [0] * self.c_ct
+        self.position = [0] * self.c_ct
         self.obj = 0
-        self.tours = self.greedy_init()
+        self.tours = getattr(self, init + '_init')()
+        # seconds between two incumbents reported through a callback
+        self.report_interval = 1
+        self.t_report = None
         return
 
     def __str__(self):
@@ -25,12 +56,24 @@ class VrpSolver(object):
             output_str += (' '.join(map(str, [c for c in tour])) + '\n')
         return output_str
 
+    def report(self, callback, force=False):
+        """
+        :param callback: called with the solution string of the current tours
+        :param force: report even if the last report is more recent than
+            report_interval
+        """
+        if callback is None:
+            return
+        if force or self.t_report is None or time() - self.t_report >= self.report_interval:
+            callback(self.__str__())
+            self.t_report = time()
+
     @staticmethod
     def dist(c1, c2):
         return math.sqrt((c1.x - c2.x) ** 2 + (c1.y - c2.y) ** 2)
 
     def tour_demand(self, tour):
-        return sum([self.customers[i].demand for i in tour])
+        return sum([self.demands[i] for i in tour])
 
     def have_duplicate_missing(self):
         customers = set(range(1, len(self.customers)))
@@ -74,11 +117,10 @@ class VrpSolver(object):
     def single_tour_dist(self, tour):
         if not self.is_valid_tour(tour):
             return math.inf
+        xs, ys = self.xs, self.ys
         tour_dist = 0
-        for i in range(1, len(tour)):
-            customer_1 = self.customers[tour[i - 1]]
-            customer_2 = self.customers[tour[i]]
-            tour_dist += self.dist(customer_1, customer_2)
+        for c_1, c_2 in zip(tour[:-1], tour[1:]):
+            tour_dist += math.hypot(xs[c_1] - xs[c_2], ys[c_1] - ys[c_2])
         return tour_dist
 
     def every_tour_dists(self):
@@ -109,9 +151,394 @@ class VrpSolver(object):
             raise ValueError("Greedy solution does not exist.")
         else:
             self.tours = tours
-            self.obj = self.total_tour_dist()
+            self.init_caches()
             return self.tours
 
+    def savings_init(self):
+        """
+        parallel clarke-wright savings: starts from one tour per customer and
+        merges the two tours ending in i and j, largest saving
+        d(0, i) + d(0, j) - d(i, j) first, while their load fits a vehicle;
+        merges with a negative saving are only made while there are more
+        tours than vehicles
+        """
+        n = self.c_ct
+        d = self.dist_matrix
+        i, j = np.triu_indices(n - 1, 1)
+        i, j = i + 1, j + 1
+        savings = d[0, i] + d[0, j] - d[i, j]
+        heap = list(zip((-savings).tolist(), i.tolist(), j.tolist()))
+        heapq.heapify(heap)
+
+        routes = {c: [c] for c in range(1, n)}
+        route_of = list(range(n))
+        loads = {c: self.demands[c] for c in range(1, n)}
+        while heap and (len(routes) > self.v_ct or heap[0][0] < 0):
+            _, a, b = heapq.heappop(heap)
+            r_a, r_b = route_of[a], route_of[b]
+            if r_a == r_b or loads[r_a] + loads[r_b] > self.v_cap:
+                continue
+            route_a, route_b = routes[r_a], routes[r_b]
+            # a has to end its route and b has to start its route
+            if route_a[-1] != a:
+                if route_a[0] != a:
+                    continue
+                route_a.reverse()
+            if route_b[0] != b:
+                if route_b[-1] != b:
+                    continue
+                route_b.reverse()
+            route_a.extend(route_b)
+            loads[r_a] += loads.pop(r_b)
+            del routes[r_b]
+            for c in route_b:
+                route_of[c] = r_a
+
+        routes = self.reduce_routes(list(routes.values()))
+        if routes is None:
+            raise ValueError("Savings solution does not exist.")
+        self.tours = [[0] + route + [0] for route in routes]
+        self.tours += [[0, 0] for _ in range(self.v_ct - len(routes))]
+        self.init_caches()
+        return self.tours
+
+    def reduce_routes(self, routes):
+        """
+        :param routes: list of customer lists without the depot
+        :return: routes with at most v_ct entries, None if that failed
+
+        dissolves a route and inserts its customers elsewhere, routes with a
+        smaller load are tried first; when no route can be dissolved, all
+        customers are packed again, largest demand first, into the route
+        where they are cheapest to insert, or first-fit if that fails
+        """
+        routes = [route[:] for route in routes]
+        while len(routes) > self.v_ct:
+            loads = [sum(self.demands[c] for c in route) for route in routes]
+            for k in sorted(range(len(routes)), key=loads.__getitem__):
+                reduced = self.dissolve_route(routes, loads, k)
+                if reduced is not None:
+                    routes = reduced
+                    break
+            else:
+                customers = [c for route in routes for c in route]
+                return self.pack_routes(customers) or self.pack_routes(customers, first_fit=True)
+        return routes
+
+    def dissolve_route(self, routes, loads, k):
+        """
+        :param routes: list of customer lists without the depot
+        :param loads: demand carried by every route
+        :param k: index of the route to dissolve
+        :return: the other routes with the customers of route k inserted,
+            None if one of them fits nowhere
+
+        customers are inserted largest demand first at their cheapest
+        feasible position; a customer that fits nowhere makes room by moving
+        one customer of another route to a third route
+        """
+        dissolved = routes[k]
+        routes = [route[:] for r, route in enumerate(routes) if r != k]
+        loads = [load for r, load in enumerate(loads) if r != k]
+        for c in sorted(dissolved, key=lambda c: -self.demands[c]):
+            best = self.best_insertion(routes, loads, c)
+            if best is None:
+                best = self.eject_insertion(routes, loads, c)
+                if best is None:
+                    return None
+            r, j = best
+            routes[r].insert(j, c)
+            loads[r] += self.demands[c]
+        return routes
+
+    def best_insertion(self, routes, loads, c, first_fit=False):
+        """
+        :param routes: list of customer lists without the depot
+        :param loads: demand carried by every route
+        :param first_fit: only look at the first route with room for c
+        :return: (r, j) of the cheapest insertion of c before routes[r][j]
+            that fits the capacity, None if c fits nowhere
+        """
+        best, best_cost = None, math.inf
+        for r, route in enumerate(routes):
+            if loads[r] + self.demands[c] > self.v_cap:
+                continue
+            cost, j = self.cheapest_insertion(route, c)
+            if cost < best_cost:
+                best, best_cost = (r, j), cost
+            if first_fit:
+                break
+        return best
+
+    def eject_insertion(self, routes, loads, c):
+        """
+        :return: (r, j) as best_insertion, after moving a customer e out of
+            routes[r] to the route where it is cheapest to insert, None if no
+            such move makes room for c
+        """
+        d = self.edge_length
+        best, best_cost = None, math.inf
+        for r, route in enumerate(routes):
+            tour = [0] + route + [0]
+            for k in range(1, len(tour) - 1):
+                e = tour[k]
+                if loads[r] - self.demands[e] + self.demands[c] > self.v_cap:
+                    continue
+                # e goes to another route, overfill r while looking for one
+                loads[r] += self.v_cap
+                target = self.best_insertion(routes, loads, e)
+                loads[r] -= self.v_cap
+                if target is None:
+                    continue
+                r_e, j_e = target
+                removed = route[:k - 1] + route[k:]
+                cost = d(tour[k - 1], tour[k + 1]) - d(tour[k - 1], e) - d(e, tour[k + 1]) + \
+                    self.cheapest_insertion(routes[r_e], e)[0] + self.cheapest_insertion(removed, c)[0]
+                if cost < best_cost:
+                    best, best_cost = (r, k - 1, r_e, j_e), cost
+        if best is None:
+            return None
+        r, k, r_e, j_e = best
+        e = routes[r].pop(k)
+        loads[r] -= self.demands[e]
+        routes[r_e].insert(j_e, e)
+        loads[r_e] += self.demands[e]
+        return r, self.cheapest_insertion(routes[r], c)[1]
+
+    def pack_routes(self, customers, first_fit=False):
+        """
+        :param customers: customers to pack, neighbors in this list stay
+            together among customers of equal demand
+        :param first_fit: put every customer into the first route with room
+            for it instead of the one where it is cheapest to insert
+        :return: at most v_ct routes, None if the packing failed
+
+        customers are packed largest demand first, each at its cheapest
+        position in the chosen route
+        """
+        routes = [[] for _ in range(self.v_ct)]
+        loads = [0] * self.v_ct
+        for c in sorted(customers, key=lambda c: -self.demands[c]):
+            best = self.best_insertion(routes, loads, c, first_fit)
+            if best is None:
+                return None
+            r, j = best
+            routes[r].insert(j, c)
+            loads[r] += self.demands[c]
+        return [route for route in routes if route]
+
+    def cheapest_insertion(self, route, c):
+        """
+        :param route: customer list without the depot
+        :return: (cost, j), inserting c before route[j] adds cost to the route
+        """
+        d = self.edge_length
+        tour = [0] + route + [0]
+        best, best_cost = 0, math.inf
+        for j in range(1, len(tour)):
+            cost = d(tour[j - 1], c) + d(c, tour[j]) - d(tour[j - 1], tour[j])
+            if cost < best_cost:
+                best, best_cost = j - 1, cost
+        return best_cost, best
+
+    def sweep_init(self):
+        """
+        sweep: visits customers by polar angle around the depot and starts a
+        new tour whenever the next customer does not fit; every customer is
+        tried as the first one and the shortest solution using at most
+        v_ct tours is kept
+        """
+        x, y = self.customers.x, self.customers.y
+        angles = np.arctan2(y[1:] - y[0], x[1:] - x[0])
+        order = (np.argsort(angles, kind='stable') + 1).tolist()
+        d = self.edge_length
+        best, best_dist = None, math.inf
+        fewest = None
+        for start in range(len(order)):
+            rotated = order[start:] + order[:start]
+            tours = [[0]]
+            load = 0
+            for c in rotated:
+                if load + self.demands[c] > self.v_cap:
+                    tours[-1].append(0)
+                    tours.append([0])
+                    load = 0
+                tours[-1].append(c)
+                load += self.demands[c]
+            tours[-1].append(0)
+            if len(tours) > self.v_ct:
+                if fewest is None or len(tours) < len(fewest):
+                    fewest = tours
+                continue
+            tours_dist = sum(d(tour[k], tour[k + 1]) for tour in tours for k in range(len(tour) - 1))
+            if tours_dist < best_dist:
+                best, best_dist = tours, tours_dist
+
+        if best is None:
+            # no rotation fits the fleet, repair the one closest to it
+            routes = self.reduce_routes([tour[1:-1] for tour in fewest])
+            if routes is None:
+                raise ValueError("Sweep solution does not exist.")
+            best = [[0] + route + [0] for route in routes]
+        self.tours = best + [[0, 0] for _ in range(self.v_ct - len(best))]
+        self.init_caches()
+        return self.tours
+
+    def init_caches(self):
+        """
+        per tour caches, kept up to date by commit:
+        loads[i] is the demand carried by tour i, lengths[i] its length and
+        prefix[i][k] the demand of tours[i][:k]
+        """
+        self.loads = [0] * len(self.tours)
+        self.lengths = [0] * len(self.tours)
+        self.prefix = [None] * len(self.tours)
+        for i in range(len(self.tours)):
+            self.update_cache(i)
+        self.obj = sum(self.lengths)
+
+    def update_cache(self, i):
+        tour = self.tours[i]
+        for k in range(1, len(tour) - 1):
+            self.route[tour[k]] = i
+            self.position[tour[k]] = k
+        self.prefix[i] = [0] + list(accumulate(self.demands[c] for c in tour))
+        self.loads[i] = self.prefix[i][-1]
+        self.lengths[i] = self.single_tour_dist(tour)
+
+    def nearest_neighbors(self, k):
+        """
+        :param k: number of neighbors per customer
+        :return: list of lists, the k nearest other customers of every
+            customer sorted by distance, the depot is never a candidate
+        """
+        dist = self.dist_matrix.copy()
+        np.fill_diagonal(dist, np.inf)
+        dist[:, 0] = np.inf
+        k = min(k, self.c_ct - 2)
+        if k <= 0:
+            return [[] for _ in range(self.c_ct)]
+        return np.argsort(dist, axis=1, kind='stable')[:, :k].tolist()
+
+    def all_shifts(self, i_from):
+        for i_to, tour_to in enumerate(self.tours):
+            if i_from == i_to: continue
+            for j_to in range(1, len(tour_to) - 1):
+                yield i_to, j_to
+
+    def granular_shifts(self, i_from, start_from, end_from):
+        """
+        :return: (i_to, j_to) of the insertions that put an end of the
+            segment next to one of its candidate neighbors
+        """
+        tour_from = self.tours[i_from]
+        for c in (tour_from[start_from], tour_from[end_from]):
+            for v in self.neighbors[c]:
+                i_to = self.route[v]
+                if i_to == i_from: continue
+                q = self.position[v]
+                yield i_to, q
+                if q + 1 < len(self.tours[i_to]) - 1:
+                    yield i_to, q + 1
+
+    def all_interchanges(self, i_1):
+        for i_2, tour_2 in enumerate(self.tours):
+            if i_1 == i_2: continue
+            for start_2, end_2 in itertools.combinations(range(1, len(tour_2) - 1), 2):
+                yield i_2, start_2, end_2
+
+    def granular_interchanges(self, i_1, start_1, end_1):
+        """
+        :return: (i_2, start_2, end_2) of the second segments that are
+            preceded or followed by a candidate neighbor of an end of the
+            first segment
+        """
+        tour_1 = self.tours[i_1]
+        for c in (tour_1[start_1], tour_1[end_1]):
+            for v in self.neighbors[c]:
+                i_2 = self.route[v]
+                if i_2 == i_1: continue
+                q = self.position[v]
+                for end_2 in range(q + 2, len(self.tours[i_2]) - 1):
+                    yield i_2, q + 1, end_2
+                for start_2 in range(1, q - 1):
+                    yield i_2, start_2, q - 1
+
+    def all_ladders(self, i_1):
+        for i_2, tour_2 in enumerate(self.tours):
+            if i_1 == i_2: continue
+            for j_2 in range(2, len(tour_2) - 2):
+                yield i_2, j_2
+
+    def granular_ladders(self, i_1, j_1):
+        """
+        :return: (i_2, j_2) of the splits next to a candidate neighbor of
+            either end of the split edge of tour i_1
+        """
+        tour_1 = self.tours[i_1]
+        for c in (tour_1[j_1 - 1], tour_1[j_1]):
+            for v in self.neighbors[c]:
+                i_2 = self.route[v]
+                if i_2 == i_1: continue
+                q = self.position[v]
+                for j_2 in (q, q + 1):
+                    if 2 <= j_2 < len(self.tours[i_2]) - 2:
+                        yield i_2, j_2
+
+    def commit(self, changes, delta, debug=False):
+        """
+        :param changes: list of (tour index, new tour)
+        :param delta: objective change of the move
+        :param debug: recompute everything and compare with the cached values
+
+        the only place tours change during local search, keeps self.obj and
+        the per tour caches in sync with self.tours
+        """
+        for i, tour in changes:
+            self.tours[i] = tour
+            self.update_cache(i)
+        self.obj += delta
+        if debug:
+            self.check_consistency()
+
+    def check_consistency(self):
+        """
+        full recomputation of the cached objective and tour loads, raises if
+        an incremental update went wrong
+        """
+        obj = self.total_tour_dist()
+        if abs(obj - self.obj) > 10 ** -6 * max(1, obj):
+            raise ValueError("Cached objective {} differs from {}".format(self.obj, obj))
+        if self.loads != [self.tour_demand(tour) for tour in self.tours]:
+            raise ValueError("Cached tour loads are out of date.")
+        for i, tour in enumerate(self.tours):
+            if self.prefix[i] != [0] + list(accumulate(self.demands[c] for c in tour)):
+                raise ValueError("Cached demand prefix of tour {} is out of date.".format(i))
+            if abs(self.lengths[i] - self.single_tour_dist(tour)) > 10 ** -6 * max(1, obj):
+                raise ValueError("Cached length of tour {} is out of date.".format(i))
+
+    def eval_shift(self, i_from, start_from, end_from, i_to, j_to):
+        """
+        :return: (delta, reverse), delta is inf if the move is infeasible and
+            reverse tells if the segment is inserted reversed
+
+        only the three removed and three added edges are evaluated
+        """
+        tour_from = self.tours[i_from]
+        tour_to = self.tours[i_to]
+        seg_demand = self.prefix[i_from][end_from + 1] - self.prefix[i_from][start_from]
+        if self.loads[i_to] + seg_demand > self.v_cap:
+            return math.inf, False
+        d = self.edge_length
+        p, s, e, n = tour_from[start_from - 1], tour_from[start_from], tour_from[end_from], tour_from[end_from + 1]
+        a, b = tour_to[j_to - 1], tour_to[j_to]
+        base = d(p, n) - d(p, s) - d(e, n) - d(a, b)
+        delta_1 = base + d(a, s) + d(e, b)
+        delta_2 = base + d(a, e) + d(s, b)
+        if delta_2 < delta_1:
+            return delta_2, True
+        return delta_1, False
+
     def shift(self, i_from, start_from, end_from, i_to, j_to, debug=False):
         """
         :param i_from: index of tour shift from
@@ -119,258 +546,257 @@ class VrpSolver(object):
         :param end_from: end index of segment (inclusive)
         :param i_to: index of tour shift to
         :param j_to: location
-        :param debug: print details if True
+        :param debug: print details and check the caches if True
         :return: True if improved
 
         shift a segment of tour into another tour
         2 possible ways:
         shift directly and reverse after shift
+        the new tours are built only if the move is committed
         """
-        tour_from_old = self.tours[i_from]
-        tour_to_old = self.tours[i_to]
-        improved = False
+        delta, reverse = self.eval_shift(i_from, start_from, end_from, i_to, j_to)
+        if delta >= -self.CMP_THRESHOLD:
+            return False
+
+        tour_from = self.tours[i_from]
+        tour_to = self.tours[i_to]
+        seg_shift = tour_from[start_from: end_from + 1]
+        if reverse:
+            seg_shift = seg_shift[::-1]
+        tour_from_new = tour_from[:start_from] + tour_from[end_from + 1:]
+        tour_to_new = tour_to[:j_to] + seg_shift + tour_to[j_to:]
         if debug:
             print("".join(["-"] * 10))
             print("old tours")
-            print(tour_from_old)
-            print(tour_to_old)
-
-        seg_shift = tour_from_old[start_from: end_from + 1]
-
-        tour_from_new = tour_from_old[:start_from] + tour_from_old[end_from + 1:]
-        tour_to_new_1 = tour_to_old[:j_to] + seg_shift + tour_to_old[j_to:]
-        tour_to_new_2 = tour_to_old[:j_to] + seg_shift[::-1] + tour_to_old[j_to:]
-        if debug:
-            print("seg_shift")
-            print(seg_shift)
+            print(tour_from)
+            print(tour_to)
             print("new tours")
-            print("{}|{}".format(tour_from_old[:start_from], tour_from_old[end_from + 1:]))
-            print("{}|{}|{}".format(tour_to_old[:j_to], seg_shift, tour_to_old[j_to:]))
-            print("{}|{}|{}".format(tour_to_old[:j_to], seg_shift[::-1], tour_to_old[j_to:]))
-
-        dist_from_old = self.single_tour_dist(tour_from_old)
-        dist_to_old = self.single_tour_dist(tour_to_old)
-
-        dist_from_new = self.single_tour_dist(tour_from_new)
-
-        dist_to_new_1 = self.single_tour_dist(tour_to_new_1)
-        dist_to_new_2 = self.single_tour_dist(tour_to_new_2)
-
-        obj_new_1 = self.obj - \
-                    (dist_from_old + dist_to_old) + \
-                    (dist_from_new + dist_to_new_1)
+            print(tour_from_new)
+            print(tour_to_new)
+        self.commit([(i_from, tour_from_new), (i_to, tour_to_new)], delta, debug)
+        return True
 
-        obj_new_2 = self.obj - \
-                    (dist_from_old + dist_to_old) + \
-                    (dist_from_new + dist_to_new_2)
-
-        if obj_new_1 < self.obj - self.CMP_THRESHOLD:
-            self.tours[i_from] = tour_from_new
-            self.tours[i_to] = tour_to_new_1
-            # self.obj = obj_new_1
-            self.obj = self.total_tour_dist()
-            improved = True
-
-        if obj_new_2 < self.obj - self.CMP_THRESHOLD:
-            self.tours[i_from] = tour_from_new
-            self.tours[i_to] = tour_to_new_2
-            # self.obj = obj_new_2
-            self.obj = self.total_tour_dist()
-            improved = True
+    def eval_interchange(self, i_1, start_1, end_1, i_2, start_2, end_2):
+        """
+        :return: (delta, reverse_2, reverse_1), delta is inf if the move is
+            infeasible, reverse_2 tells if segment 2 enters tour 1 reversed
+            and reverse_1 if segment 1 enters tour 2 reversed
 
-        return improved
+        the two tours change independently, so each keeps its better
+        orientation of the incoming segment
+        """
+        tour_1 = self.tours[i_1]
+        tour_2 = self.tours[i_2]
+        seg_1_demand = self.prefix[i_1][end_1 + 1] - self.prefix[i_1][start_1]
+        seg_2_demand = self.prefix[i_2][end_2 + 1] - self.prefix[i_2][start_2]
+        if self.loads[i_1] - seg_1_demand + seg_2_demand > self.v_cap or \
+                self.loads[i_2] - seg_2_demand + seg_1_demand > self.v_cap:
+            return math.inf, False, False
+        d = self.edge_length
+        p_1, s_1, e_1, n_1 = tour_1[start_1 - 1], tour_1[start_1], tour_1[end_1], tour_1[end_1 + 1]
+        p_2, s_2, e_2, n_2 = tour_2[start_2 - 1], tour_2[start_2], tour_2[end_2], tour_2[end_2 + 1]
+        # tour1 <- seg2, not reversed / reversed
+        delta_1_1 = d(p_1, s_2) + d(e_2, n_1)
+        delta_1_2 = d(p_1, e_2) + d(s_2, n_1)
+        # tour2 <- seg1, not reversed / reversed
+        delta_2_1 = d(p_2, s_1) + d(e_1, n_2)
+        delta_2_2 = d(p_2, e_1) + d(s_1, n_2)
+        delta = min(delta_1_1, delta_1_2) + min(delta_2_1, delta_2_2) - \
+            d(p_1, s_1) - d(e_1, n_1) - d(p_2, s_2) - d(e_2, n_2)
+        return delta, delta_1_2 < delta_1_1, delta_2_2 < delta_2_1
 
     def interchange(self, i_1, start_1, end_1, i_2, start_2, end_2, debug=False):
         """
-        :param i_1:
-        :param start_1:
-        :param end_1:
-        :param i_2:
-        :param start_2:
-        :param end_2:
-        :param debug:
-        :return:
+        :param i_1: index of the first tour
+        :param start_1: start index of the first segment
+        :param end_1: end index of the first segment (inclusive)
+        :param i_2: index of the second tour
+        :param start_2: start index of the second segment
+        :param end_2: end index of the second segment (inclusive)
+        :param debug: print details and check the caches if True
+        :return: True if improved
 
         interchange 2 segments from 2 tours
         4 possible ways:
         interchange directly, reverse either segment, reverse both segments
         """
-        tour_1_old = self.tours[i_1]
-        tour_2_old = self.tours[i_2]
-        improved = False
+        delta, reverse_2, reverse_1 = self.eval_interchange(i_1, start_1, end_1, i_2, start_2, end_2)
+        if delta >= -self.CMP_THRESHOLD:
+            return False
+
+        tour_1 = self.tours[i_1]
+        tour_2 = self.tours[i_2]
+        seg_1 = tour_1[start_1: end_1 + 1]
+        seg_2 = tour_2[start_2: end_2 + 1]
+        tour_1_new = tour_1[:start_1] + (seg_2[::-1] if reverse_2 else seg_2) + tour_1[end_1 + 1:]
+        tour_2_new = tour_2[:start_2] + (seg_1[::-1] if reverse_1 else seg_1) + tour_2[end_2 + 1:]
         if debug:
             print("".join(["-"] * 10))
             print("old tours")
-            print(tour_1_old)
-            print(tour_2_old)
-
-        seg_1 = tour_1_old[start_1: end_1 + 1]
-        seg_2 = tour_2_old[start_2: end_2 + 1]
-        if debug:
-            print("segs")
-            print("{}, {}, {}".format(start_1, end_1, seg_1))
-            print("{}, {}, {}".format(start_2, end_2, seg_2))
-
-        # tour1 <- seg2, not reversed
-        tour_1_new_1 = tour_1_old[: start_1] + seg_2 + tour_1_old[end_1 + 1:]
-        # tour1 <- seg2, reversed
-        tour_1_new_2 = tour_1_old[: start_1] + seg_2[::-1] + tour_1_old[end_1 + 1:]
-        # tour2 <- seg1, not reversed
-        tour_2_new_1 = tour_2_old[: start_2] + seg_1 + tour_2_old[end_2 + 1:]
-        # tour2 <- seg1, reversed
-        tour_2_new_2 = tour_2_old[: start_2] + seg_1[::-1] + tour_2_old[end_2 + 1:]
-        if debug:
+            print(tour_1)
+            print(tour_2)
             print("new tours")
-            print("{}|{}|{}".format(tour_1_old[: start_1], seg_2, tour_1_old[end_1 + 1:]))
-            print("{}|{}|{}".format(tour_1_old[: start_1], seg_2[::-1], tour_1_old[end_1 + 1:]))
-            print("{}|{}|{}".format(tour_2_old[: start_1], seg_1, tour_2_old[end_2 + 1:]))
-            print("{}|{}|{}".format(tour_2_old[: start_1], seg_1[::-1], tour_2_old[end_2 + 1:]))
-
-        # old tour lengths
-        dist_1_old = self.single_tour_dist(tour_1_old)
-        dist_2_old = self.single_tour_dist(tour_2_old)
-
-        # new tour lengths
-        dist_1_new_1 = self.single_tour_dist(tour_1_new_1)
-        dist_1_new_2 = self.single_tour_dist(tour_1_new_2)
-        dist_2_new_1 = self.single_tour_dist(tour_2_new_1)
-        dist_2_new_2 = self.single_tour_dist(tour_2_new_2)
-
-        new_obj_1 = self.obj - (dist_1_old + dist_2_old) + (dist_1_new_1 + dist_2_new_1)
-        new_obj_2 = self.obj - (dist_1_old + dist_2_old) + (dist_1_new_1 + dist_2_new_2)
-        new_obj_3 = self.obj - (dist_1_old + dist_2_old) + (dist_1_new_2 + dist_2_new_1)
-        new_obj_4 = self.obj - (dist_1_old + dist_2_old) + (dist_1_new_2 + dist_2_new_2)
-
-        if new_obj_1 < self.obj - self.CMP_THRESHOLD:
-            self.tours[i_1] = tour_1_new_1
-            self.tours[i_2] = tour_2_new_1
-            # self.obj = new_obj_1
-            self.obj = self.total_tour_dist()
-            improved = True
-
-        if new_obj_2 < self.obj - self.CMP_THRESHOLD:
-            self.tours[i_1] = tour_1_new_1
-            self.tours[i_2] = tour_2_new_2
-            # self.obj = new_obj_2
-            self.obj = self.total_tour_dist()
-            improved = True
-
-        if new_obj_3 < self.obj - self.CMP_THRESHOLD:
-            self.tours[i_1] = tour_1_new_2
-            self.tours[i_2] = tour_2_new_1
-            # self.obj = new_obj_3
-            self.obj = self.total_tour_dist()
-            improved = True
-
-        if new_obj_4 < self.obj - self.CMP_THRESHOLD:
-            self.tours[i_1] = tour_1_new_2
-            self.tours[i_2] = tour_2_new_2
-            # self.obj = new_obj_4
-            self.obj = self.total_tour_dist()
-            improved = True
-
-        return improved
+            print(tour_1_new)
+            print(tour_2_new)
+        self.commit([(i_1, tour_1_new), (i_2, tour_2_new)], delta, debug)
+        return True
+
+    def eval_exchange(self, i, start, end):
+        """
+        :return: (delta, ), from the two removed and two added edges
+        """
+        tour = self.tours[i]
+        d = self.edge_length
+        p, s, e, n = tour[start - 1], tour[start], tour[end], tour[end + 1]
+        return d(p, e) + d(s, n) - d(p, s) - d(e, n),
 
     def exchange(self, i, start, end, debug=False):
         """
-        :param i:
-        :param start:
-        :param end:
-        :param debug:
-        :return:
+        :param i: index of the tour
+        :param start: start index of segment
+        :param end: end index of segment (inclusive)
+        :param debug: print details and check the caches if True
+        :return: True if improved
 
         reverse a segment of a tour
         only 1 way to do this
         """
-        improved = False
-        tour_old = self.tours[i]
-        seg = tour_old[start: end + 1]
-        tour_new = tour_old[:start] + seg[::-1] + tour_old[end + 1:]
+        delta, = self.eval_exchange(i, start, end)
+        if delta >= -self.CMP_THRESHOLD:
+            return False
+
+        tour = self.tours[i]
+        tour_new = tour[:start] + tour[start: end + 1][::-1] + tour[end + 1:]
         if debug:
             print("".join(["-"] * 10))
             print("old tour")
-            print(tour_old)
-            print("seg")
-            print(seg)
+            print(tour)
             print("new tour")
-            print("{}|{}|{}".format(tour_old[:start], seg[::-1], tour_old[end + 1:]))
+            print(tour_new)
+        self.commit([(i, tour_new)], delta, debug)
+        return True
+
+    def eval_ladder(self, i_1, i_2, j_1, j_2):
+        """
+        :return: (delta, cross), delta is inf if both ways are infeasible and
+            cross tells if the heads are joined with each other
+        """
+        tour_1 = self.tours[i_1]
+        tour_2 = self.tours[i_2]
+        head_1 = self.prefix[i_1][j_1]
+        head_2 = self.prefix[i_2][j_2]
+        tail_1 = self.loads[i_1] - head_1
+        tail_2 = self.loads[i_2] - head_2
+        d = self.edge_length
+        h_1, t_1 = tour_1[j_1 - 1], tour_1[j_1]
+        h_2, t_2 = tour_2[j_2 - 1], tour_2[j_2]
+        removed = d(h_1, t_1) + d(h_2, t_2)
 
-        new_obj = self.obj - self.single_tour_dist(tour_old) + self.single_tour_dist(tour_new)
-        if new_obj < self.obj - self.CMP_THRESHOLD:
-            self.tours[i] = tour_new
-            # self.obj = new_obj
-            self.obj = self.total_tour_dist()
-            improved = True
-        return improved
+        # head + tail
+        delta_1 = math.inf
+        if head_1 + tail_2 <= self.v_cap and head_2 + tail_1 <= self.v_cap:
+            delta_1 = d(h_1, t_2) + d(h_2, t_1) - removed
+        # head + head(reversed) / tail(reversed) + tail
+        delta_2 = math.inf
+        if head_1 + head_2 <= self.v_cap and tail_1 + tail_2 <= self.v_cap:
+            delta_2 = d(h_1, h_2) + d(t_1, t_2) - removed
+        if delta_2 < delta_1:
+            return delta_2, True
+        return delta_1, False
 
     def ladder(self, i_1, i_2, j_1, j_2, debug=False):
         """
-        :param i_1:
-        :param i_2:
-        :param j_1:
-        :param j_2:
-        :param debug:
-        :return:
+        :param i_1: index of the first tour
+        :param i_2: index of the second tour
+        :param j_1: first tail index of the first tour
+        :param j_2: first tail index of the second tour
+        :param debug: print details and check the caches if True
+        :return: True if improved
 
         split two tours into head and tail respectively, and re-shuffle them
         2 possible ways
         """
-        tour_1_old = self.tours[i_1]
-        tour_2_old = self.tours[i_2]
-        improved = False
+        delta, cross = self.eval_ladder(i_1, i_2, j_1, j_2)
+        if delta >= -self.CMP_THRESHOLD:
+            return False
+
+        tour_1 = self.tours[i_1]
+        tour_2 = self.tours[i_2]
+        if cross:
+            tour_1_new = tour_1[:j_1] + tour_2[:j_2][::-1]
+            tour_2_new = tour_1[j_1:][::-1] + tour_2[j_2:]
+        else:
+            tour_1_new = tour_1[:j_1] + tour_2[j_2:]
+            tour_2_new = tour_2[:j_2] + tour_1[j_1:]
         if debug:
             print("".join(["-"] * 10))
             print("old tours")
-            print(tour_1_old)
-            print(tour_2_old)
-
-        seg_1_head = tour_1_old[:j_1]
-        seg_1_tail = tour_1_old[j_1:]
-        seg_2_head = tour_2_old[:j_2]
-        seg_2_tail = tour_2_old[j_2:]
-
-        # head + tail
-        tour_1_new_1 = seg_1_head + seg_2_tail
-        tour_2_new_1 = seg_2_head + seg_1_tail
-
-        # head + head(reversed) / tail(reversed) + tail
-        tour_1_new_2 = seg_1_head + seg_2_head[::-1]
-        tour_2_new_2 = seg_1_tail[::-1] + seg_2_tail
-        if debug:
+            print(tour_1)
+            print(tour_2)
             print("new tours")
-            print("{}|{}".format(seg_1_head, seg_2_tail))
-            print("{}|{}".format(seg_2_head, seg_1_tail))
-            print("{}|{}".format(seg_1_head, seg_2_head[::-1]))
-            print("{}|{}".format(seg_1_tail[::-1], seg_2_tail))
-
-        # old tour lengths
-        dist_1_old = self.single_tour_dist(tour_1_old)
-        dist_2_old = self.single_tour_dist(tour_2_old)
-
-        # new tour lengths
-        dist_1_new_1 = self.single_tour_dist(tour_1_new_1)
-        dist_1_new_2 = self.single_tour_dist(tour_1_new_2)
-        dist_2_new_1 = self.single_tour_dist(tour_2_new_1)
-        dist_2_new_2 = self.single_tour_dist(tour_2_new_2)
-
-        new_obj_1 = self.obj - (dist_1_old + dist_2_old) + (dist_1_new_1 + dist_2_new_1)
-        new_obj_2 = self.obj - (dist_1_old + dist_2_old) + (dist_1_new_2 + dist_2_new_2)
-
-        if new_obj_1 < self.obj - self.CMP_THRESHOLD:
-            self.tours[i_1] = tour_1_new_1
-            self.tours[i_2] = tour_2_new_1
-            # self.obj = new_obj_1
-            self.obj = self.total_tour_dist()
-            improved = True
-
-        if new_obj_2 < self.obj - self.CMP_THRESHOLD:
-            self.tours[i_1] = tour_1_new_2
-            self.tours[i_2] = tour_2_new_2
-            # self.obj = new_obj_2
-            self.obj = self.total_tour_dist()
-            improved = True
-
-        return improved
+            print(tour_1_new)
+            print(tour_2_new)
+        self.commit([(i_1, tour_1_new), (i_2, tour_2_new)], delta, debug)
+        return True
+
+    def candidates(self, neighborhood, i, granular=False):
+        """
+        :param neighborhood: 'shift', 'interchange', 'exchange' or 'ladder'
+        :param i: index of the first tour of the moves
+        :param granular: only moves next to candidate neighbors
+        :return: generator of argument tuples of the neighborhood's move
+        """
+        tour = self.tours[i]
+        if neighborhood == 'ladder':
+            for j_1 in range(2, len(tour) - 2):
+                moves = self.granular_ladders(i, j_1) if granular else self.all_ladders(i)
+                for i_2, j_2 in moves:
+                    yield i, i_2, j_1, j_2
+            return
+        for start, end in itertools.combinations(range(1, len(tour) - 1), 2):
+            if neighborhood == 'exchange':
+                yield i, start, end
+            elif neighborhood == 'shift':
+                moves = self.granular_shifts(i, start, end) if granular else self.all_shifts(i)
+                for i_to, j_to in moves:
+                    yield i, start, end, i_to, j_to
+            else:
+                moves = self.granular_interchanges(i, start, end) if granular else self.all_interchanges(i)
+                for i_2, start_2, end_2 in moves:
+                    yield i, start, end, i_2, start_2, end_2
+
+    def search(self, neighborhood, policy='first', granular=False, debug=False):
+        """
+        :param neighborhood: 'shift', 'interchange', 'exchange' or 'ladder'
+        :param policy: move selection, see solve
+        :param granular: only moves next to candidate neighbors
+        :param debug: print details and check the caches if True
+        :return: True if a move was applied
+        """
+        order = list(range(len(self.tours)))
+        if policy == 'random':
+            self.rng.shuffle(order)
+        elif policy == 'rotating':
+            k = self.rotation.get(neighborhood, 0) % len(order)
+            order = order[k:] + order[:k]
+        move = getattr(self, neighborhood)
+        evaluate = getattr(self, 'eval_' + neighborhood)
+
+        best_delta, best_args = -self.CMP_THRESHOLD, None
+        for i in order:
+            for args in self.candidates(neighborhood, i, granular):
+                delta = evaluate(*args)[0]
+                if delta >= best_delta:
+                    continue
+                if policy == 'best':
+                    best_delta, best_args = delta, args
+                elif move(*args, debug=debug):
+                    # the next search of this neighborhood starts after tour i
+                    self.rotation[neighborhood] = i + 1
+                    return True
+        if best_args is not None:
+            return move(*best_args, debug=debug)
+        return False
 
     def solve(self,
               shift=True,
@@ -379,73 +805,67 @@ class VrpSolver(object):
               ladder=True,
               t_threshold=None,
               verbose=False,
-              debug=False):
+              debug=False,
+              callback=None,
+              granular=False,
+              policy='first',
+              seed=0):
+        """
+        :param shift: try moving a segment into another tour
+        :param interchange: try swapping segments of two tours
+        :param exchange: try reversing a segment of a tour
+        :param ladder: try swapping the tails of two tours
+        :param t_threshold: time limit in seconds
+        :param verbose: print the objective of every iteration
+        :param debug: print every move and check the caches after it
+        :param callback: called with the solution string of incumbents
+        :param granular: only try shift, interchange and ladder moves that
+            add an edge between a customer and one of its candidate neighbors
+            until no such move improves, then all moves for the remaining time
+        :param policy: move selection in every neighborhood:
+            'first' applies the first improving move scanning tours in order,
+            'rotating' starts each scan after the tour of the last move,
+            'random' scans tours in random order, the moves of a tour in
+            their usual order,
+            'best' applies the best improving move of the neighborhood,
+            'vnd' is 'first' with the neighborhoods ordered cheapest first and
+            going back to the first one after every improvement
+        :param seed: seed of the 'random' policy
+        :return: list of tours
+        """
+        neighborhoods = [name for name, on in (('shift', shift), ('interchange', interchange),
+                                                ('exchange', exchange), ('ladder', ladder)) if on]
+        if policy == 'vnd':
+            neighborhoods.sort(key=self.VND_ORDER.index)
+        self.rng = random.Random(seed)
+        self.rotation = {}
         improved = True
         t_start = time()
+        self.report(callback, force=True)
 
         while improved:
             if t_threshold and time() - t_start >= t_threshold:
                 break
-            shift_improved = False
-            interchange_improved = False
-            exchange_improved = False
-            ladder_improved = False
-            self.obj = self.total_tour_dist()
             prev_obj = self.obj
             if verbose or debug:
                 print(self.obj)
 
-            # try shift
-            if shift:
-                for i_from, tour_from in enumerate(self.tours):
-                    if shift_improved: break
-                    for start_from, end_from in itertools.combinations(range(1, len(tour_from) - 1), 2):
-                        if shift_improved: break
-                        for i_to, tour_to in enumerate(self.tours):
-                            if shift_improved: break
-                            if i_from == i_to: continue
-                            for j_to in range(1, len(tour_to) - 1):
-                                if self.shift(i_from, start_from, end_from, i_to, j_to, debug):
-                                    shift_improved = True
-                                    break
-
-            # try interchange
-            if interchange:
-                for i_1, tour_1 in enumerate(self.tours):
-                    if interchange_improved: break
-                    for start_1, end_1 in itertools.combinations(range(1, len(tour_1) - 1), 2):
-                        if interchange_improved: break
-                        for i_2, tour_2 in enumerate(self.tours):
-                            if interchange_improved: break
-                            if i_1 == i_2: continue
-                            for start_2, end_2 in itertools.combinations(range(1, len(tour_2) - 1), 2):
-                                if self.interchange(i_1, start_1, end_1, i_2, start_2, end_2, debug):
-                                    interchange_improved = True
-                                    break
-
-            # try exchange
-            if exchange:
-                for i, tour in enumerate(self.tours):
-                    for start, end in itertools.combinations(range(1, len(tour) - 1), 2):
-                        if self.exchange(i, start, end, debug):
-                            exchange_improved = True
-                            break
-
-            # try ladder
-            if ladder:
-                for i_1, tour_1 in enumerate(self.tours):
-                    if ladder_improved: break
-                    for j_1 in range(2, len(tour_1) - 2):
-                        if ladder_improved: break
-                        for i_2, tour_2 in enumerate(self.tours):
-                            if i_1 == i_2: continue
-                            if ladder_improved: break
-                            for j_2 in range(2, len(tour_2) - 2):
-                                if self.ladder(i_1, i_2, j_1, j_2, debug):
-                                    ladder_improved = True
-                                    break
+            if policy == 'vnd':
+                applied = []
+                for name in neighborhoods:
+                    applied.append(self.search(name, 'first', granular, debug))
+                    if applied[-1]:
+                        break
+            else:
+                applied = [self.search(name, policy, granular, debug) for name in neighborhoods]
             if verbose or debug:
-                print(shift_improved, interchange_improved, exchange_improved, ladder_improved)
+                print(dict(zip(neighborhoods, applied)))
                 print(prev_obj - self.obj)
-            improved = shift_improved or interchange_improved or exchange_improved or ladder_improved
+            improved = any(applied)
+            if improved:
+                self.report(callback)
+            elif granular:
+                # finish the granular local optimum with the full neighborhoods
+                granular = False
+                improved = True
         return self.tours
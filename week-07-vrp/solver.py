@@ -1,32 +1,79 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
-from collections import namedtuple
+import numpy as np
 from VrpSolver import VrpSolver
 
 
-Customer = namedtuple("Customer", ['index', 'demand', 'x', 'y'])
+class Customer(object):
+    __slots__ = ['index', 'demand', 'x', 'y']
 
+    def __init__(self, index, demand, x, y):
+        self.index = index
+        self.demand = demand
+        self.x = x
+        self.y = y
 
-def solve_it(input_data):
+    def __eq__(self, other):
+        return (self.index, self.demand, self.x, self.y) == (other.index, other.demand, other.x, other.y)
+
+    def __hash__(self):
+        return hash((self.index, self.demand, self.x, self.y))
+
+
+class Customers(object):
+    """
+    struct-of-arrays customer set with an int demand column and contiguous
+    float64 x / y columns, customers[i] builds a Customer record
+    """
+    __slots__ = ['demand', 'x', 'y']
+
+    def __init__(self, demand, x, y):
+        self.demand = np.ascontiguousarray(demand, dtype=np.int64)
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.demand)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+        i = range(len(self))[i]
+        return Customer(i, int(self.demand[i]), float(self.x[i]), float(self.y[i]))
+
+    def __iter__(self):
+        return map(Customer, range(len(self)), self.demand.tolist(), self.x.tolist(), self.y.tolist())
+
+
+def parse_input(input_data):
+    # bulk parse every number in one pass, one (demand, x, y) row per customer
+    data = np.fromstring(input_data, dtype=np.float64, sep=' ')
+    customer_count = int(data[0])
+    vehicle_count = int(data[1])
+    vehicle_capacity = int(data[2])
+    columns = data[3:3 + 3 * customer_count].reshape(customer_count, 3)
+    return vehicle_count, vehicle_capacity, columns[:, 0].astype(np.int64), columns[:, 1:]
+
+
+def solve_it(input_data, time_limit=None, callback=None):
     # Modify this code to run your optimization algorithm
 
     # parse the input
-    lines = input_data.split('\n')
-
-    parts = lines[0].split()
-    customer_count = int(parts[0])
-    vehicle_count = int(parts[1])
-    vehicle_capacity = int(parts[2])
-    
-    customers = []
-    for i in range(1, customer_count+1):
-        line = lines[i]
-        parts = line.split()
-        customers.append(Customer(i-1, int(parts[0]), float(parts[1]), float(parts[2])))
+    vehicle_count, vehicle_capacity, demands, locations = parse_input(input_data)
+
+    customers = Customers(demands, locations[:, 0], locations[:, 1])
 
     # the depot is always the first customer in the input
-    solver = VrpSolver(customers, vehicle_count, vehicle_capacity)
-    solver.solve(t_threshold=3600*24)
+    # start from savings, fall back to sweep and greedy when it needs too many vehicles
+    for init in ('savings', 'sweep', 'greedy'):
+        try:
+            solver = VrpSolver(customers, vehicle_count, vehicle_capacity, init=init)
+            break
+        except ValueError:
+            if init == 'greedy':
+                raise
+    solver.solve(t_threshold=time_limit or 3600*24, callback=callback, granular=True,
+                 policy='best')
 
     output_data = solver.__str__()
     return output_data